@@ -25,5 +25,5 @@ with open(Path(__file__).parent / "info.json") as fp:
 
 async def setup(bot: Red) -> None:
     cog = AutoGist(bot)
-    bot.add_cog(cog)
     await cog.initialize()
+    bot.add_cog(cog)
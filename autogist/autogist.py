@@ -12,12 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import contextlib
+import datetime
+import random
+import time
+from collections import Counter
 from io import BytesIO
-from typing import Any, Dict, Literal, Mapping, MutableMapping, Tuple
+from typing import Any, Dict, Literal, Mapping, Set
 
 import aiohttp
-import cachetools
 import discord
 import gidgethub
 import gidgethub.aiohttp
@@ -25,16 +29,60 @@ from redbot.core import commands
 from redbot.core.bot import Red
 from redbot.core.commands import GuildContext, NoParseOptional as Optional
 from redbot.core.config import Config
-from redbot.core.utils.chat_formatting import humanize_list, inline
+from redbot.core.data_manager import cog_data_path
+from redbot.core.utils.chat_formatting import box, humanize_list, inline
 
 from .discord_utils import fetch_attachment_from_message, safe_raw_edit
 from .errors import HandledHTTPError
 from .guild_data import GuildData
 from .log import log
+from .message_index import MessageIndex, MessageIndexEntry
+from .upload_queue import UploadQueue
 
 RequestType = Literal["discord_deleted_user", "owner", "user", "user_strict"]
 
 MAX_SIZE = 2 * 1024 * 1024
+GUILD_DEFAULTS: Dict[str, Any] = {
+    "blocklist_mode": False,
+    "file_extensions": [".txt", ".log"],
+    "listen_to_bots": False,
+    "listen_to_self": False,
+}
+# how often (in seconds) the message index is checked for compaction
+INDEX_COMPACTION_INTERVAL = 24 * 60 * 60
+# max amount of messages waiting for upload, messages above that are dropped
+UPLOAD_QUEUE_SIZE = 100
+DEFAULT_UPLOAD_WORKERS = 2
+MAX_UPLOAD_WORKERS = 10
+# max amount of tries and the delays (in seconds) used for retrying GitHub requests
+MAX_REQUEST_TRIES = 4
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+# GitHub asks to wait at least a minute after hitting secondary rate limit
+SECONDARY_RATE_LIMIT_DELAY = 60
+# max time (in seconds) a request waits for primary rate limit to reset
+MAX_RATE_LIMIT_WAIT = 15 * 60
+
+
+def _backoff_delay(tries: int, *, base: float, max_delay: float) -> float:
+    """
+    Returns delay (in seconds) before next retry of failed GitHub API request.
+
+    Primary rate limit is waited out based on the limits tracked by gidgethub
+    and secondary rate limit always waits at least `SECONDARY_RATE_LIMIT_DELAY`,
+    so this mostly applies to requests that GitHub was unable to process.
+    The delay doubles with each try (up to ``max_delay``) and half of it is random
+    so that the upload workers don't retry at the same time.
+    """
+    delay = min(max_delay, base * 2 ** tries)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _is_secondary_rate_limit(exc: gidgethub.HTTPException) -> bool:
+    if exc.status_code not in (403, 429):
+        return False
+    message = str(exc).lower()
+    return "secondary rate limit" in message or "abuse" in message
 
 
 class AutoGist(commands.Cog):
@@ -44,12 +92,7 @@ class AutoGist(commands.Cog):
         self.bot = bot
         self._session: aiohttp.ClientSession
         self.config = Config.get_conf(self, 176070082584248320, force_registration=True)
-        self.config.register_guild(
-            blocklist_mode=False,
-            file_extensions=[".txt", ".log"],
-            listen_to_bots=False,
-            listen_to_self=False,
-        )
+        self.config.register_guild(**GUILD_DEFAULTS)
         # state:
         #  - `True` - allowed
         #  - `False` - blocked
@@ -59,24 +102,53 @@ class AutoGist(commands.Cog):
         #  list of IDs of all uploaded gists for the files uploaded by user
         #  the only purpose of this are data deletion requests
         self.config.register_user(gists=[])
-        # message_cache:
-        #  {message_id: (user_id, gist_id, bot_message_id)}
-        self._message_cache: MutableMapping[
-            int, Tuple[int, str, int]
-        ] = cachetools.Cache(maxsize=10_000)
+        self.config.register_global(upload_workers=DEFAULT_UPLOAD_WORKERS)
+        # message_index:
+        #  {message_id: (user_id, gist_id, bot_message_id, created_at)}
+        self._message_index = MessageIndex(cog_data_path(self) / "message_index.db")
+        self._compaction_task: "Optional[asyncio.Task[None]]" = None
+        # IDs of messages that are waiting in the upload queue or are being uploaded
+        self._pending_uploads: Set[int] = set()
+        # IDs of pending messages that were deleted before their upload finished
+        self._deleted_uploads: Set[int] = set()
+        self._upload_queue = UploadQueue(
+            self._upload_attachment,
+            workers=DEFAULT_UPLOAD_WORKERS,
+            maxsize=UPLOAD_QUEUE_SIZE,
+        )
+        # both caches are fully loaded in `initialize()`
         self._guild_cache: Dict[int, GuildData] = {}
+        self._channel_cache: Dict[int, Optional[bool]] = {}
+        # {check_name: amount of messages ignored because of it}
+        # `total` is the amount of all messages checked by `_should_ignore()`
+        self.ignore_stats: Counter[str] = Counter()
 
     async def initialize(self) -> None:
+        await self._load_caches()
         self._session = aiohttp.ClientSession()
         self.gh = gidgethub.aiohttp.GitHubAPI(
             session=self._session,
             requester="AutoGist cog for Red-DiscordBot",
             oauth_token=await self._get_token(),
         )
+        self._compaction_task = asyncio.create_task(self._compaction_loop())
+        self._upload_queue.set_worker_count(await self.config.upload_workers())
 
     def cog_unload(self) -> None:
+        if self._compaction_task is not None:
+            self._compaction_task.cancel()
+        self._upload_queue.stop()
+        self._message_index.close()
         self._session.detach()
 
+    async def _compaction_loop(self) -> None:
+        while True:
+            await asyncio.sleep(INDEX_COMPACTION_INTERVAL)
+            try:
+                await self._message_index.compact()
+            except Exception:
+                log.exception("Compaction of the message index failed.")
+
     async def red_get_data_for_user(self, *, user_id: int) -> Dict[str, BytesIO]:
         gists = await self.config.user_from_id(user_id).gists()
         if not gists:
@@ -118,6 +190,7 @@ class AutoGist(commands.Cog):
                 failed.append(gist_id)
 
         await user_scope.clear()
+        await self._message_index.remove_user(user_id)
 
         if failed:
             gist_links = "\n".join(
@@ -131,13 +204,40 @@ class AutoGist(commands.Cog):
                 "AutoGist has removed all the other data for the user successfully."
             )
 
-    async def get_guild_data(self, guild: discord.Guild) -> GuildData:
+    async def _load_caches(self) -> None:
+        """Load settings of all guilds and channels with one config read each."""
+        all_channels = await self.config.all_channels()
+        self._channel_cache = {
+            channel_id: data["state"] for channel_id, data in all_channels.items()
+        }
+        all_guilds = await self.config.all_guilds()
+        self._guild_cache = {
+            guild_id: self._make_guild_data(guild_id, data)
+            for guild_id, data in all_guilds.items()
+        }
+        log.debug(
+            "Loaded settings of %s guilds and %s channels.",
+            len(self._guild_cache),
+            len(self._channel_cache),
+        )
+
+    def _make_guild_data(self, guild_id: int, data: Dict[str, Any]) -> GuildData:
+        return GuildData(
+            self.bot,
+            self.config,
+            guild_id,
+            channel_states=self._channel_cache,
+            **data,
+        )
+
+    def get_guild_data(self, guild: discord.Guild) -> GuildData:
         try:
             return self._guild_cache[guild.id]
         except KeyError:
             pass
 
-        data = await GuildData.from_guild(self.bot, self.config, guild)
+        # all stored settings were loaded so this guild uses the default settings
+        data = self._make_guild_data(guild.id, GUILD_DEFAULTS)
         self._guild_cache[guild.id] = data
 
         return data
@@ -177,6 +277,56 @@ class AutoGist(commands.Cog):
         )
         await ctx.send(message)
 
+    @commands.is_owner()
+    @autogistset.command(name="stats")
+    async def autogistset_stats(self, ctx: commands.Context) -> None:
+        """
+        Show how many messages were ignored by each of AutoGist's checks
+        and the state of the upload queue.
+        """
+        total = self.ignore_stats["total"]
+        lines = [f"{'Checked messages':<24}{total:>10}"]
+        lines.extend(
+            f"{name:<24}{count:>10}{count / total:>9.1%}"
+            for name, count in self.ignore_stats.most_common()
+            if name != "total"
+        )
+        queue = self._upload_queue
+        lines.append("\nUpload queue:")
+        lines.append(f"{'workers':<24}{queue.worker_count:>10}")
+        lines.append(f"{'depth':<24}{queue.depth:>10}")
+        lines.append(f"{'max depth':<24}{queue.max_depth:>10}")
+        lines.append(f"{'size limit':<24}{queue.maxsize:>10}")
+        lines.extend(
+            f"{name:<24}{queue.stats[name]:>10}"
+            for name in ("queued", "processed", "failed", "dropped")
+        )
+        await ctx.send(box("\n".join(lines)))
+
+    @commands.is_owner()
+    @autogistset.command(name="uploadworkers")
+    async def autogistset_uploadworkers(
+        self, ctx: commands.Context, workers: Optional[int] = None
+    ) -> None:
+        """
+        Set how many attachments can be uploaded to Gist at the same time.
+
+        Leave empty to reset to default (2).
+        """
+        if workers is None:
+            await self.config.upload_workers.clear()
+            workers = await self.config.upload_workers()
+        elif not 1 <= workers <= MAX_UPLOAD_WORKERS:
+            await ctx.send(
+                f"Amount of workers has to be in range 1-{MAX_UPLOAD_WORKERS}."
+            )
+            return
+        else:
+            await self.config.upload_workers.set(workers)
+
+        self._upload_queue.set_worker_count(workers)
+        await ctx.send(f"AutoGist will now upload up to {workers} files at once.")
+
     @commands.guild_only()
     @autogistset.command(name="channeldefault")
     async def autogistset_channeldefault(
@@ -195,7 +345,7 @@ class AutoGist(commands.Cog):
         By default, guilds will not listen to any channel.
         Use `[p]autogist channeldefault` without a setting to see current mode.
         """
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         if allow is None:
             if guild_data.blocklist_mode:
                 msg = "AutoGist listens to channels in this server by default."
@@ -233,7 +383,7 @@ class AutoGist(commands.Cog):
         if not channels:
             await ctx.send_help()
             return
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         await guild_data.update_channel_states(channels, True)
         await ctx.send("Bot will now listen to the messages in given channels.")
 
@@ -248,7 +398,7 @@ class AutoGist(commands.Cog):
         if not channels:
             await ctx.send_help()
             return
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         await guild_data.update_channel_states(channels, False)
         await ctx.send("Bot will no longer listen to the messages in given channels.")
 
@@ -256,11 +406,11 @@ class AutoGist(commands.Cog):
     @autogistset.command(name="listoverridden")
     async def autogistset_listoverridden(self, ctx: GuildContext) -> None:
         """List guild channels that don't use the default setting."""
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         overriden = [
             channel.mention
             for channel in ctx.guild.text_channels
-            if await guild_data.is_overridden(channel)
+            if guild_data.is_overridden(channel)
         ]
 
         if not overriden:
@@ -285,7 +435,7 @@ class AutoGist(commands.Cog):
         NOTE: To make bot listen to messages from itself,
         you need to use `[p]autogistset listentoself` command.
         """
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         if state is None:
             if guild_data.listen_to_bots:
                 msg = "AutoGist listens to messages from other bots in this server."
@@ -332,7 +482,7 @@ class AutoGist(commands.Cog):
         See also: `[p]autogistset listentobots` command,
         that makes the bot listen to other bots.
         """
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         if state is None:
             if guild_data.listen_to_self:
                 msg = "AutoGist listens to messages from its bot user in this server."
@@ -393,7 +543,7 @@ class AutoGist(commands.Cog):
         if not extensions:
             await ctx.send_help()
             return
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         await guild_data.add_file_extensions(extensions)
         await ctx.send("Bot will now upload files with the given extensions.")
 
@@ -412,7 +562,7 @@ class AutoGist(commands.Cog):
         if not extensions:
             await ctx.send_help()
             return
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         await guild_data.remove_file_extensions(extensions)
         await ctx.send("Bot will now no longer upload files with the given extensions.")
 
@@ -421,7 +571,7 @@ class AutoGist(commands.Cog):
         """
         List file extensions that are required for AutoGist to upload file to Gist.
         """
-        guild_data = await self.get_guild_data(ctx.guild)
+        guild_data = self.get_guild_data(ctx.guild)
         msg = "AutoGist will upload files with these extensions to Gist:\n"
         extensions = humanize_list(list(map(inline, guild_data.file_extensions)))
         await ctx.send(f"{msg}{extensions}")
@@ -430,61 +580,97 @@ class AutoGist(commands.Cog):
         """
         Checks whether message should be ignored in the `on_message` listener.
 
+        The checks are done in stages, from the cheapest to the most expensive ones,
+        and the amount of messages rejected by each stage is counted
+        in `AutoGist.ignore_stats`.
+
+        Returns
+        -------
+        bool
+            `True` if message should be ignored, `False` otherwise
+        """
+        self.ignore_stats["total"] += 1
+        reason = self._check_message(message) or await self._check_message_async(
+            message
+        )
+        if reason is not None:
+            self.ignore_stats[reason] += 1
+            return True
+        return False
+
+    def _check_message(self, message: discord.Message) -> Optional[str]:
+        """
+        Does synchronous checks that only need the message and the cached settings.
+
         This checks whether:
-        - OAuth token has been set
-        - message has been sent in guild
-        - message author is allowed by Red's allowlist and blocklist
-        - cog is disabled in guild
-        - bot has permissions to send messages in the channel message was sent in
-        - channel is permitted by cog's allowlist/blocklist
         - message has exactly one attachment
         - attachment's size isn't bigger than `MAX_SIZE`
+        - message has been sent in guild
+        - OAuth token has been set
         - extension of the attachment's filename matches guild's configured extensions
+        - message author is permitted by guild's settings
+        - channel is permitted by cog's allowlist/blocklist
+        - bot has permissions to send messages in the channel message was sent in
 
         Returns
         -------
-        bool
-            `True` if message should be ignored, `False` otherwise
+        Optional[str]
+            Name of the failed check or `None`, if all checks passed.
         """
+        # this is ran for every message so the most common rejections go first
+        attachments = message.attachments
+        if len(attachments) != 1:
+            return "attachment_count"
+
+        attachment = attachments[0]
+        if attachment.size > MAX_SIZE:
+            return "attachment_size"
+
         guild = message.guild
-        channel = message.channel
+        if guild is None:
+            return "not_in_guild"
 
         if self.gh.oauth_token is None:
-            return True
+            return "no_token"
 
-        if guild is None:
-            return True
-        assert isinstance(channel, discord.abc.GuildChannel)
+        guild_data = self.get_guild_data(guild)
+        if not attachment.filename.lower().endswith(guild_data.file_extensions):
+            return "file_extension"
 
-        if not await self.bot.allowed_by_whitelist_blacklist(message.author):
-            return True
+        if not guild_data.is_permitted(message.author):
+            return "author_not_permitted"
 
-        if await self.bot.cog_disabled_in_guild(self, guild):
-            return True
+        channel = message.channel
+        assert isinstance(channel, discord.abc.GuildChannel)
+        if not guild_data.is_enabled_for_channel(channel):
+            return "channel_disabled"
 
         if not channel.permissions_for(guild.me).send_messages:
-            return True
-
-        guild_data = await self.get_guild_data(guild)
-        if not guild_data.is_permitted(message.author):
-            return True
+            return "missing_permissions"
 
-        if not await guild_data.is_enabled_for_channel(channel):
-            return True
+        return None
 
-        if len(message.attachments) != 1:
-            return True
+    async def _check_message_async(self, message: discord.Message) -> Optional[str]:
+        """
+        Does checks that need to await Red's APIs.
 
-        attachment = message.attachments[0]
+        This checks whether:
+        - message author is allowed by Red's allowlist and blocklist
+        - cog is disabled in guild
 
-        if attachment.size > MAX_SIZE:
-            return True
+        Returns
+        -------
+        Optional[str]
+            Name of the failed check or `None`, if all checks passed.
+        """
+        if not await self.bot.allowed_by_whitelist_blacklist(message.author):
+            return "allowlist_blocklist"
 
-        filename = attachment.filename.lower()
-        if not filename.endswith(guild_data.file_extensions):
-            return True
+        assert message.guild is not None
+        if await self.bot.cog_disabled_in_guild(self, message.guild):
+            return "cog_disabled"
 
-        return False
+        return None
 
     async def _request(
         self,
@@ -511,39 +697,81 @@ class AutoGist(commands.Cog):
             Data returned by the specified ``method``.
         """
         func = getattr(self.gh, method)
-        try:
-            data = await func(url, url_vars, **kwargs)
-        except gidgethub.RateLimitExceeded as e:
-            log.warning(
-                "Rate limit exceeded. Rate limit resets at %s",
-                e.rate_limit.reset_datetime,
-            )
-            raise HandledHTTPError()
-        except gidgethub.GitHubBroken as e:
-            log.warning(
-                "GitHub is having issues right now"
-                " and couldn't process the request (status code: %s).",
-                e.status_code,
-                exc_info=e,
+        for tries in range(MAX_REQUEST_TRIES):
+            await self._wait_for_rate_limit()
+            delay = _backoff_delay(
+                tries, base=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY
             )
-            raise HandledHTTPError()
-        except gidgethub.HTTPException as e:
-            if e.status_code == 401:
-                log.error("Set GitHub token is invalid.")
-            elif e.status_code == 404:
-                if method == "post":
-                    log.error("Set GitHub token doesn't have `gist` scope.")
+            try:
+                return await func(url, url_vars, **kwargs)
+            except gidgethub.RateLimitExceeded as e:
+                # gidgethub doesn't update `rate_limit` when the request fails,
+                # the wait for the reset is done at the beginning of the next try
+                self.gh.rate_limit = e.rate_limit
+                delay = 0
+            except gidgethub.GitHubBroken as e:
+                log.warning(
+                    "GitHub is having issues right now"
+                    " and couldn't process the request (status code: %s).",
+                    e.status_code,
+                    exc_info=e,
+                )
+            except gidgethub.HTTPException as e:
+                if _is_secondary_rate_limit(e):
+                    log.warning("Secondary rate limit exceeded.")
+                    delay = max(delay, SECONDARY_RATE_LIMIT_DELAY)
+                elif e.status_code == 401:
+                    log.error("Set GitHub token is invalid.")
+                    raise HandledHTTPError()
+                elif e.status_code == 404:
+                    if method == "post":
+                        log.error("Set GitHub token doesn't have `gist` scope.")
+                    else:
+                        log.error(
+                            "Gist with the given ID (%s) couldn't have been found"
+                            " or the set GitHub token doesn't have access to it.",
+                            url_vars.get("gist_id"),
+                        )
+                    raise HandledHTTPError()
                 else:
                     log.error(
-                        "Gist with the given ID (%s) couldn't have been found"
-                        " or the set GitHub token doesn't have access to it.",
-                        url_vars.get("gist_id"),
+                        "Unexpected error occurred (status code: %s).",
+                        e.status_code,
+                        exc_info=e,
                     )
-            else:
-                log.error("Unexpected error occurred (status code: %s).", exc_info=e)
-            raise HandledHTTPError()
+                    raise HandledHTTPError()
 
-        return data
+            if tries + 1 < MAX_REQUEST_TRIES:
+                log.debug("Retrying GitHub request in %.2fs.", delay)
+                await asyncio.sleep(delay)
+
+        log.warning("GitHub request failed after %s tries.", MAX_REQUEST_TRIES)
+        raise HandledHTTPError()
+
+    async def _wait_for_rate_limit(self) -> None:
+        """
+        Waits until the rate limit of the set token resets, if it has been used up.
+
+        Raises
+        ------
+        HandledHTTPError
+            When the rate limit resets later than in `MAX_RATE_LIMIT_WAIT` seconds.
+        """
+        rate_limit = self.gh.rate_limit
+        if rate_limit is None or rate_limit.remaining > 0:
+            return
+        now = datetime.datetime.now(datetime.timezone.utc)
+        delay = (rate_limit.reset_datetime - now).total_seconds()
+        if delay <= 0:
+            return
+        if delay > MAX_RATE_LIMIT_WAIT:
+            log.warning(
+                "Rate limit exceeded. Rate limit resets at %s",
+                rate_limit.reset_datetime,
+            )
+            raise HandledHTTPError()
+        log.info("Rate limit exceeded, waiting %.0fs for it to reset.", delay)
+        await asyncio.sleep(delay)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message) -> None:
@@ -553,12 +781,38 @@ class AutoGist(commands.Cog):
         if await self._should_ignore(message):
             return
 
+        if self._upload_queue.put(message):
+            self._pending_uploads.add(message.id)
+        else:
+            log.warning(
+                "Upload queue is full, the attachment from message with ID %s-%s"
+                " won't be uploaded.",
+                message.channel.id,
+                message.id,
+            )
+
+    async def _upload_attachment(self, message: discord.Message) -> None:
+        """Uploads the attachment from given message, ran by upload queue's workers."""
+        try:
+            await self._do_upload_attachment(message)
+        finally:
+            self._pending_uploads.discard(message.id)
+            self._deleted_uploads.discard(message.id)
+
+    async def _do_upload_attachment(self, message: discord.Message) -> None:
+        # the message can get deleted at any point while it waits in the queue
+        # or while it's being uploaded - see `on_raw_message_delete()`
+        if message.id in self._deleted_uploads:
+            return
+
         assert message.guild is not None
         guild = message.guild
         author = message.author
 
-        filename, content = await fetch_attachment_from_message(message)
-        if content is None:
+        filename, content = await fetch_attachment_from_message(
+            self._session, message, max_size=MAX_SIZE
+        )
+        if content is None or message.id in self._deleted_uploads:
             return
 
         try:
@@ -576,16 +830,28 @@ class AutoGist(commands.Cog):
             )
         except HandledHTTPError:
             # already handled in request method
-            pass
-        else:
-            bot_message = await message.channel.send(
-                f"File by {author} automatically uploaded to gist: <{data['html_url']}>"
-            )
-            gist_id = data["id"]
-            self._message_cache[message.id] = (author.id, gist_id, bot_message.id)
-            async with self.config.user(message.author).gists() as user_gists:
-                # keeping this so that I can easily remove all gists
-                user_gists.append(gist_id)
+            return
+
+        gist_id = data["id"]
+        if message.id in self._deleted_uploads:
+            # the message got deleted while the request was made (or waited)
+            with contextlib.suppress(HandledHTTPError):
+                await self._request("delete", "/gists/{gist_id}", {"gist_id": gist_id})
+            return
+
+        bot_message = await message.channel.send(
+            f"File by {author} automatically uploaded to gist: <{data['html_url']}>"
+        )
+        entry = MessageIndexEntry(author.id, gist_id, bot_message.id, time.time())
+        await self._message_index.add(message.id, entry)
+        async with self.config.user(message.author).gists() as user_gists:
+            # keeping this so that I can easily remove all gists
+            user_gists.append(gist_id)
+
+        if message.id in self._deleted_uploads:
+            # the message got deleted while the bot message was being sent
+            if (entry := await self._message_index.pop(message.id)) is not None:
+                await self._delete_gist(entry, message.channel.id)
 
     @commands.Cog.listener()
     async def on_raw_message_delete(
@@ -593,15 +859,25 @@ class AutoGist(commands.Cog):
     ) -> None:
         """
         Deletes gist and updates bot's message (the one with gist link),
-        if deleted message has an entry in cog's message cache of gists.
+        if deleted message has an entry in cog's message index of gists.
 
         This is done to address privacy concerns of
         uploading contents of user-attached file to gist.
         """
-        if (cached_data := self._message_cache.pop(payload.message_id, None)) is None:
+        if payload.guild_id is None:
+            return
+        if payload.message_id in self._pending_uploads:
+            # the worker uploading the attachment will take care of it
+            self._deleted_uploads.add(payload.message_id)
+            return
+        if (entry := await self._message_index.pop(payload.message_id)) is None:
             return
 
-        user_id, gist_id, bot_message_id = cached_data
+        await self._delete_gist(entry, payload.channel_id)
+
+    async def _delete_gist(self, entry: MessageIndexEntry, channel_id: int) -> None:
+        """Deletes gist from given index entry and updates bot's message."""
+        user_id, gist_id, bot_message_id, _ = entry
 
         msg_content = "The original message with the file has been removed."
         # already handled in request method
@@ -616,9 +892,7 @@ class AutoGist(commands.Cog):
                 with contextlib.suppress(ValueError):
                     user_gists.remove(gist_id)
 
-        await safe_raw_edit(
-            self.bot, payload.channel_id, bot_message_id, content=msg_content
-        )
+        await safe_raw_edit(self.bot, channel_id, bot_message_id, content=msg_content)
 
     @commands.Cog.listener()
     async def on_red_api_tokens_update(
@@ -628,3 +902,5 @@ class AutoGist(commands.Cog):
         if service_name != "github":
             return
         self.gh.oauth_token = await self._get_token(api_tokens)
+        # rate limit is tracked per token
+        self.gh.rate_limit = None
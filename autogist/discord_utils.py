@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import functools
 from typing import TYPE_CHECKING, Optional, Tuple
 
+import aiohttp
 import discord
 from redbot.core.bot import Red
 
@@ -27,6 +30,11 @@ else:
 
 from .log import log
 
+# size of the chunks in which attachments are downloaded
+CHUNK_SIZE = 64 * 1024
+# max amount of bytes that are used to detect encoding of the attachment
+MAX_DETECTION_SIZE = 256 * 1024
+
 
 # DEP-WARN
 class RawMessage(discord.Message):
@@ -120,8 +128,82 @@ async def safe_raw_edit(
         )
 
 
+async def _read_attachment(
+    session: aiohttp.ClientSession, attachment: discord.Attachment, max_size: int
+) -> Tuple[Optional[bytes], Optional[str], bool]:
+    """
+    Reads the attachment in chunks and detects its encoding while it's downloaded.
+
+    Detection is done in the default executor and stops as soon as the detector
+    is confident about the encoding or after `MAX_DETECTION_SIZE` bytes.
+
+    Returns
+    -------
+    Tuple[Optional[bytes], Optional[str], bool]
+        3-tuple of attachment's contents, its detected encoding and a flag
+        that tells whether the encoding was detected using only part of contents.
+        Contents (first value in tuple) will be `None`,
+         if the attachment is bigger than ``max_size``.
+
+    Raises
+    ------
+    aiohttp.ClientError
+        When the attachment couldn't have been downloaded.
+    """
+    loop = asyncio.get_running_loop()
+    detector = chardet.UniversalDetector()
+    detection_size = 0
+    buffer = bytearray()
+    async with session.get(attachment.url, raise_for_status=True) as resp:
+        if (resp.content_length or 0) > max_size:
+            return None, None, False
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            buffer += chunk
+            if len(buffer) > max_size:
+                return None, None, False
+            if not detector.done and detection_size < MAX_DETECTION_SIZE:
+                detection_size += len(chunk)
+                await loop.run_in_executor(None, detector.feed, chunk)
+
+    partial = not detector.done and detection_size < len(buffer)
+    detector.close()
+    return bytes(buffer), detector.result["encoding"], partial
+
+
+def _decode(
+    raw_data: bytes, encoding: str, *, partial: bool
+) -> Tuple[Optional[str], str]:
+    """
+    Decodes data with given encoding, falling back to utf-8.
+
+    If the encoding was detected using only part of the data (``partial``)
+    and neither of the encodings work, the encoding is detected again
+    using the whole data.
+
+    Returns 2-tuple of decoded contents (or `None` on failure) and used encoding.
+    """
+    encodings = [encoding]
+    if encoding != "utf-8":
+        encodings.append("utf-8")
+    for encoding in encodings:
+        try:
+            return raw_data.decode(encoding), encoding
+        except (UnicodeDecodeError, LookupError):
+            pass
+
+    if partial:
+        full_encoding = chardet.detect(raw_data)["encoding"]
+        if full_encoding is not None and full_encoding not in encodings:
+            try:
+                return raw_data.decode(full_encoding), full_encoding
+            except (UnicodeDecodeError, LookupError):
+                pass
+
+    return None, encodings[0]
+
+
 async def fetch_attachment_from_message(
-    message: discord.Message,
+    session: aiohttp.ClientSession, message: discord.Message, *, max_size: int
 ) -> Tuple[str, Optional[str]]:
     """
     Fetches contents of first attachment from given message without raising.
@@ -136,35 +218,43 @@ async def fetch_attachment_from_message(
          if method fails to fetch or decode contents of the attachment.
     """
     attachment = message.attachments[0]
-    content: Optional[str] = None
 
     try:
-        raw_data = await attachment.read()
-    except discord.HTTPException:
+        raw_data, encoding, partial = await _read_attachment(
+            session, attachment, max_size
+        )
+    except (aiohttp.ClientError, asyncio.TimeoutError):
         log.info(
             "The attachment from message with ID %s-%s"
             " couldn't have been downloaded.",
             message.channel.id,
             message.id,
         )
+        return attachment.filename, None
 
-    encoding_data = chardet.detect(raw_data)
-    encoding = encoding_data["encoding"] or "utf-8"
+    if raw_data is None:
+        log.info(
+            "The attachment from message with ID %s-%s is bigger than %s bytes.",
+            message.channel.id,
+            message.id,
+            max_size,
+        )
+        return attachment.filename, None
 
-    try:
-        content = raw_data.decode(encoding)
-    except UnicodeDecodeError:
+    encoding = encoding or "utf-8"
+    loop = asyncio.get_running_loop()
+    content, encoding = await loop.run_in_executor(
+        None, functools.partial(_decode, raw_data, encoding, partial=partial)
+    )
+    if content is None:
         if encoding != "utf-8":
-            try:
-                content = raw_data.decode("utf-8")
-            except UnicodeDecodeError:
-                log.info(
-                    "The contents of attachment from message with ID %s-%s"
-                    " couldn't have been decoded using neither %s nor utf-8 encoding.",
-                    message.channel.id,
-                    message.id,
-                    encoding,
-                )
+            log.info(
+                "The contents of attachment from message with ID %s-%s"
+                " couldn't have been decoded using neither %s nor utf-8 encoding.",
+                message.channel.id,
+                message.id,
+                encoding,
+            )
         else:
             log.info(
                 "The contents of attachment from message with ID %s-%s"
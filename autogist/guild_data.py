@@ -45,6 +45,7 @@ class GuildData:
         file_extensions: Sequence[str],
         listen_to_bots: bool,
         listen_to_self: bool,
+        channel_states: Dict[int, Optional[bool]],
     ) -> None:
         self.id: int = guild_id
         self.bot = bot
@@ -55,7 +56,9 @@ class GuildData:
         self.listen_to_bots: bool = listen_to_bots
         self.listen_to_self: bool = listen_to_self
         # state tri-bool
-        self._channel_cache: Dict[int, Optional[bool]] = {}
+        # this is a mapping with states of all channels that is shared between guilds
+        # as channel IDs are unique - channels that aren't in it have the default state
+        self._channel_cache = channel_states
 
     @property
     def config_group(self) -> Group:
@@ -66,26 +69,11 @@ class GuildData:
             self._config_group = config_group
             return config_group
 
-    @classmethod
-    async def from_guild(
-        cls, bot: Red, config: Config, guild: discord.Guild
-    ) -> GuildData:
-        data = await config.guild(guild).all()
-        return cls(bot, config, guild.id, **data)
+    def get_channel_state(self, channel: discord.TextChannel) -> Optional[bool]:
+        return self._channel_cache.get(channel.id)
 
-    async def get_channel_state(self, channel: discord.TextChannel) -> Optional[bool]:
-        try:
-            return self._channel_cache[channel.id]
-        except KeyError:
-            pass
-
-        state: Optional[bool] = await self._config.channel(channel).state()
-        self._channel_cache[channel.id] = state
-
-        return state
-
-    async def is_enabled_for_channel(self, channel: discord.TextChannel) -> bool:
-        channel_state = await self.get_channel_state(channel)
+    def is_enabled_for_channel(self, channel: discord.TextChannel) -> bool:
+        channel_state = self.get_channel_state(channel)
         if self.blocklist_mode:
             if channel_state is False:
                 return False
@@ -95,8 +83,8 @@ class GuildData:
 
         return True
 
-    async def is_overridden(self, channel: discord.TextChannel) -> bool:
-        channel_state = await self.get_channel_state(channel)
+    def is_overridden(self, channel: discord.TextChannel) -> bool:
+        channel_state = self.get_channel_state(channel)
         if channel_state is True:
             return not self.blocklist_mode
         if channel_state is False:
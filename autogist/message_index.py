@@ -0,0 +1,216 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import functools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    List,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Set,
+    TypeVar,
+)
+
+import cachetools
+
+from .log import log
+
+__all__ = ("MessageIndexEntry", "MessageIndex")
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gist_messages (
+    message_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    gist_id TEXT NOT NULL,
+    bot_message_id INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS gist_messages_user_id ON gist_messages (user_id);
+"""
+
+
+class MessageIndexEntry(NamedTuple):
+    user_id: int
+    gist_id: str
+    bot_message_id: int
+    # UNIX timestamp
+    created_at: float
+
+
+class MessageIndex:
+    """
+    Persistent index of messages which had their attachment uploaded to gist.
+
+    The index is stored in an SQLite database that is only opened on first use.
+    All database access happens in a single dedicated thread
+    and the recently added entries are additionally kept in an in-memory LRU cache.
+
+    IDs of all indexed messages are loaded into memory on first use
+    so that messages that aren't in the index can be ruled out without a query.
+    """
+
+    HOT_CACHE_SIZE = 10_000
+    # compaction is only done when this fraction of database pages is unused
+    COMPACTION_THRESHOLD = 0.25
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="autogist_index"
+        )
+        self._connection: Optional[sqlite3.Connection] = None
+        # message_id -> entry
+        self._hot_cache: MutableMapping[int, MessageIndexEntry] = cachetools.LRUCache(
+            maxsize=self.HOT_CACHE_SIZE
+        )
+        self._message_ids: Optional[Set[int]] = None
+        self._message_ids_future: "Optional[asyncio.Future[Set[int]]]" = None
+
+    async def add(self, message_id: int, entry: MessageIndexEntry) -> None:
+        (await self._get_message_ids()).add(message_id)
+        self._hot_cache[message_id] = entry
+        await self._run(self._add, message_id, entry)
+
+    async def pop(self, message_id: int) -> Optional[MessageIndexEntry]:
+        """Remove entry for message with given ID and return it, if it was found."""
+        message_ids = await self._get_message_ids()
+        if message_id not in message_ids:
+            # most of the deleted messages never had their attachment uploaded
+            return None
+        message_ids.discard(message_id)
+        if (entry := self._hot_cache.pop(message_id, None)) is not None:
+            # no need to wait for the entry to be removed from the database
+            self._run(self._pop, message_id).add_done_callback(self._log_error)
+            return entry
+        return await self._run(self._pop, message_id)
+
+    async def remove_user(self, user_id: int) -> None:
+        """Remove all entries of the user with given ID."""
+        message_ids = await self._get_message_ids()
+        for message_id, entry in list(self._hot_cache.items()):
+            if entry.user_id == user_id:
+                del self._hot_cache[message_id]
+        message_ids.difference_update(await self._run(self._remove_user, user_id))
+
+    async def compact(self) -> bool:
+        """
+        Compact the database, if enough of it is unused.
+
+        Returns `True`, if compaction was done.
+        """
+        return await self._run(self._compact)
+
+    def close(self) -> None:
+        self._executor.submit(self._close)
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _log_error(fut: "asyncio.Future[Any]") -> None:
+        if not fut.cancelled() and (exc := fut.exception()) is not None:
+            log.error("Updating the message index failed.", exc_info=exc)
+
+    async def _get_message_ids(self) -> Set[int]:
+        if self._message_ids is None:
+            # all mutations wait for this so that they are applied to the loaded set
+            if self._message_ids_future is None:
+                self._message_ids_future = self._run(self._load_message_ids)
+            try:
+                self._message_ids = await asyncio.shield(self._message_ids_future)
+            except Exception:
+                self._message_ids_future = None
+                raise
+        return self._message_ids
+
+    def _run(self, func: Callable[..., T], *args: Any) -> "asyncio.Future[T]":
+        # not a coroutine function so that the calls are submitted in call order
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    # methods below are only ran in the executor's thread
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                str(self.path), isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _load_message_ids(self) -> Set[int]:
+        cursor = self._get_connection().execute("SELECT message_id FROM gist_messages")
+        return {message_id for (message_id,) in cursor}
+
+    def _add(self, message_id: int, entry: MessageIndexEntry) -> None:
+        self._get_connection().execute(
+            "INSERT OR REPLACE INTO gist_messages"
+            " (message_id, user_id, gist_id, bot_message_id, created_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (message_id, *entry),
+        )
+
+    def _pop(self, message_id: int) -> Optional[MessageIndexEntry]:
+        connection = self._get_connection()
+        row = connection.execute(
+            "SELECT user_id, gist_id, bot_message_id, created_at"
+            " FROM gist_messages WHERE message_id = ?",
+            (message_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute(
+            "DELETE FROM gist_messages WHERE message_id = ?", (message_id,)
+        )
+        return MessageIndexEntry(*row)
+
+    def _remove_user(self, user_id: int) -> List[int]:
+        """Remove all entries of the user with given ID and return their message IDs."""
+        connection = self._get_connection()
+        message_ids = [
+            message_id
+            for (message_id,) in connection.execute(
+                "SELECT message_id FROM gist_messages WHERE user_id = ?", (user_id,)
+            )
+        ]
+        connection.execute("DELETE FROM gist_messages WHERE user_id = ?", (user_id,))
+        return message_ids
+
+    def _compact(self) -> bool:
+        connection = self._get_connection()
+        (page_count,) = connection.execute("PRAGMA page_count").fetchone()
+        (freelist_count,) = connection.execute("PRAGMA freelist_count").fetchone()
+        if not page_count or freelist_count / page_count < self.COMPACTION_THRESHOLD:
+            return False
+        log.debug(
+            "Compacting message index (%s out of %s pages unused).",
+            freelist_count,
+            page_count,
+        )
+        connection.execute("VACUUM")
+        return True
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
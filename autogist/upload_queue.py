@@ -0,0 +1,118 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Set
+
+import discord
+
+from .log import log
+
+__all__ = ("UploadQueue",)
+
+UploadHandler = Callable[[discord.Message], Awaitable[None]]
+
+
+class UploadQueue:
+    """
+    Bounded queue of messages with attachments to upload,
+    processed by a fixed amount of workers.
+
+    Messages that don't fit in the queue are dropped.
+    """
+
+    def __init__(self, handler: UploadHandler, *, workers: int, maxsize: int) -> None:
+        self._handler = handler
+        self._queue: "asyncio.Queue[discord.Message]" = asyncio.Queue(maxsize=maxsize)
+        self._worker_count = workers
+        # worker index -> worker task
+        self._workers: Dict[int, "asyncio.Task[None]"] = {}
+        # indexes of workers that are currently processing a message
+        self._busy_workers: Set[int] = set()
+        # amounts of messages that were: `queued`, `processed`, `failed`, `dropped`
+        self.stats: Counter[str] = Counter()
+        # highest depth of the queue since it was started
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def maxsize(self) -> int:
+        return self._queue.maxsize
+
+    @property
+    def worker_count(self) -> int:
+        return self._worker_count
+
+    def put(self, message: discord.Message) -> bool:
+        """
+        Put the message in the queue.
+
+        Returns `False`, if the message was dropped because the queue is full.
+        """
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["queued"] += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        return True
+
+    def stop(self) -> None:
+        for task in self._workers.values():
+            task.cancel()
+        self._workers.clear()
+        self._busy_workers.clear()
+
+    def set_worker_count(self, workers: int) -> None:
+        """
+        Change the amount of workers, starting them if needed.
+
+        Excess idle workers are stopped right away, excess busy workers
+        exit as soon as they finish processing their current message.
+        """
+        self._worker_count = workers
+        for idx, task in list(self._workers.items()):
+            if idx >= workers and idx not in self._busy_workers:
+                # cancelling `Queue.get()` doesn't lose any queued message
+                task.cancel()
+                del self._workers[idx]
+        for idx in range(workers):
+            if idx not in self._workers:
+                self._workers[idx] = asyncio.create_task(self._worker(idx))
+
+    async def _worker(self, idx: int) -> None:
+        while idx < self._worker_count:
+            message = await self._queue.get()
+            self._busy_workers.add(idx)
+            try:
+                await self._handler(message)
+            except Exception:
+                self.stats["failed"] += 1
+                log.exception(
+                    "Unexpected error occurred when processing message with ID %s-%s.",
+                    message.channel.id,
+                    message.id,
+                )
+            else:
+                self.stats["processed"] += 1
+            finally:
+                self._busy_workers.discard(idx)
+                self._queue.task_done()
+        # the worker count has been lowered while this worker was busy
+        del self._workers[idx]
@@ -24,4 +24,6 @@ with open(Path(__file__).parent / "info.json") as fp:
 
 
 async def setup(bot: Red) -> None:
-    bot.add_cog(Mee6Rank(bot))
+    cog = Mee6Rank(bot)
+    await cog.initialize()
+    bot.add_cog(cog)
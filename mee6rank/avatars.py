@@ -0,0 +1,76 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image
+
+__all__ = ("AvatarKey", "AvatarCache")
+
+# (user ID, avatar hash)
+AvatarKey = Tuple[int, str]
+
+
+def _image_size(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class AvatarCache:
+    """
+    LRU cache of avatars that are already fitted and masked for the rank card.
+
+    Size of the cache is bounded by the total amount of bytes
+    of decoded avatar images.
+    Cached images are shared between renders and should *never* be modified.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.current_size = 0
+        self._data: OrderedDict[AvatarKey, Image.Image] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: AvatarKey) -> Optional[Image.Image]:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._data[key]
+
+    def set(self, key: AvatarKey, avatar: Image.Image) -> None:
+        size = _image_size(avatar)
+        if size > self.max_size:
+            return
+        if (old_avatar := self._data.pop(key, None)) is not None:
+            self.current_size -= _image_size(old_avatar)
+        self._data[key] = avatar
+        self.current_size += size
+        while self.current_size > self.max_size:
+            _, evicted = self._data.popitem(last=False)
+            self.current_size -= _image_size(evicted)
+
+    def remove_user(self, user_id: int) -> None:
+        for key in [key for key in self._data if key[0] == user_id]:
+            self.current_size -= _image_size(self._data.pop(key))
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.current_size = 0
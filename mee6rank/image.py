@@ -14,15 +14,18 @@
 
 from __future__ import annotations
 
+import threading
 from abc import ABC
+from io import BytesIO
 from pathlib import Path
-from typing import Any, BinaryIO, Dict, NamedTuple, Optional, Tuple, Union
+from typing import Any, BinaryIO, Dict, Iterable, NamedTuple, Optional, Tuple, Union
 
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 
 from .figures import Point
 from .player import PlayerWithAvatar
-from .utils import natural_size
+from .text import TextCache
+from .utils import LRUDict, natural_size
 
 
 class CoordsInfo(NamedTuple):
@@ -30,12 +33,46 @@ class CoordsInfo(NamedTuple):
     font_name: Optional[str] = None
 
 
+class PlayerCard(NamedTuple):
+    """
+    Plain player data needed to render the rank card.
+
+    Unlike `PlayerWithAvatar`, this doesn't reference any Discord objects
+    so it can be sent to worker processes.
+    """
+
+    name: str
+    discriminator: str
+    level: int
+    rank: int
+    level_xp: int
+    level_total_xp: int
+    avatar: Image.Image
+
+    @classmethod
+    def from_player(cls, player: PlayerWithAvatar) -> PlayerCard:
+        return cls(
+            name=player.member.name,
+            discriminator=player.member.discriminator,
+            level=player.level,
+            rank=player.rank,
+            level_xp=player.level_xp,
+            level_total_xp=player.level_total_xp,
+            avatar=player.avatar,
+        )
+
+
 class Mee6RankImageTemplate:
+    # space (in pixels) between the cards on the leaderboard image
+    LEADERBOARD_CARD_SPACING = 10
+    # max amount of progressbar sprites (one per progressbar width) kept in memory
+    MAX_PROGRESSBAR_SPRITES = 64
+
     def __init__(
         self,
         *,
         coords: Dict[str, CoordsInfo],
-        fonts: Dict[str, ImageFont.ImageFont],
+        fonts: Dict[str, ImageFont.FreeTypeFont],
         avatar_mask: Path,
         card_base: Path,
         progressbar: Path,
@@ -48,13 +85,142 @@ class Mee6RankImageTemplate:
         self.progressbar = progressbar
         self.progressbar_rounding_mask = progressbar_rounding_mask
 
+        self.text: TextCache
+        self._avatar_mask_image: Image.Image
+        # fixed layers of the progressbar, sprites are made from them on demand
+        self._progressbar_top: Image.Image
+        self._progressbar_background: Image.Image
+        self._progressbar_rounding_mask: Image.Image
+        # renders happen in executor threads
+        self._progressbar_lock: threading.Lock
+        self._progressbar_sprites: LRUDict[int, Image.Image]
+        self.load_assets()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # fonts and decoded assets can't (or shouldn't) be pickled,
+        # they are loaded again when the template is unpickled
+        state = {
+            attr_name: getattr(self, attr_name)
+            for attr_name in (
+                "coords",
+                "avatar_mask",
+                "card_base",
+                "progressbar",
+                "progressbar_rounding_mask",
+            )
+        }
+        state["font_infos"] = {
+            font_name: (font.path, font.size) for font_name, font in self.fonts.items()
+        }
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        font_infos = state.pop("font_infos")
+        self.__dict__.update(state)
+        self.fonts = {
+            font_name: ImageFont.truetype(path, size)
+            for font_name, (path, size) in font_infos.items()
+        }
+        self.load_assets()
+
+    def load_assets(self) -> None:
+        """Decodes all images used by the template and pre-renders static text."""
+        self.text = TextCache(self.fonts)
+        for coords_name, text, fill in (
+            ("level_caption", "LEVEL", "#62d3f5"),
+            ("rank_caption", "RANK", "#ffffff"),
+        ):
+            font_name = self.coords[coords_name].font_name
+            assert isinstance(font_name, str), "mypy"  # captions have font name defined
+            self.text.prerender(font_name, text, fill)
+        with Image.open(self.avatar_mask) as avatar_mask_image:
+            self._avatar_mask_image = avatar_mask_image.convert("L")
+        with Image.open(self.progressbar) as progressbar_image:
+            self._progressbar_top = progressbar_image.convert("RGBA")
+        self._progressbar_background = Image.new(
+            mode="RGBA", size=self._progressbar_top.size, color="#484b4e"
+        )
+        with Image.open(self.progressbar_rounding_mask) as rounding_mask_image:
+            self._progressbar_rounding_mask = rounding_mask_image.convert("L")
+        self._progressbar_lock = threading.Lock()
+        self._progressbar_sprites = LRUDict(self.MAX_PROGRESSBAR_SPRITES)
+
     def get_coords(self, coords_name: str) -> CoordsInfo:
         """Get coords for given element."""
         return self.coords[coords_name]
 
-    def generate_image(self, player: PlayerWithAvatar) -> Mee6RankImage:
+    @property
+    def avatar_size(self) -> Tuple[int, int]:
+        """Size of the avatar on the card."""
+        return self._avatar_mask_image.size
+
+    @property
+    def avatar_cdn_size(self) -> int:
+        """Smallest avatar size available on Discord's CDN that covers the mask."""
+        # CDN only serves sizes that are powers of 2
+        return 1 << (max(self.avatar_size) - 1).bit_length()
+
+    def prepare_avatar(self, data: bytes) -> Image.Image:
+        """Fit the avatar to the card's avatar size and apply the mask to it."""
+        with Image.open(BytesIO(data)) as avatar:
+            avatar_output = ImageOps.fit(
+                avatar.convert("RGBA"), self.avatar_size, centering=(0.5, 0.5)
+            )
+        avatar_output.putalpha(self._avatar_mask_image)
+        return avatar_output
+
+    @property
+    def progressbar_width(self) -> int:
+        return self._progressbar_top.width
+
+    def get_progressbar(self, width: int) -> Image.Image:
+        """Get progressbar sprite filled up to given width. It shouldn't be modified."""
+        with self._progressbar_lock:
+            sprite = self._progressbar_sprites.get(width)
+        if sprite is None:
+            sprite = self._make_progressbar(width)
+            with self._progressbar_lock:
+                self._progressbar_sprites[width] = sprite
+        return sprite
+
+    def _make_progressbar(self, width: int) -> Image.Image:
+        result = self._progressbar_background.copy()
+
+        # make progressbar
+        progressbar = Image.new(mode="RGBA", size=result.size)
+        progressbar_draw = ImageDraw.Draw(progressbar)
+        progressbar_draw.rectangle(xy=(0, 0, width, result.height), fill="#62d3f5")
+
+        # make and apply rounding mask for end (right side) of the progressbar
+        rounding_mask = self._progressbar_rounding_mask
+        mask = Image.new(mode="L", size=progressbar.size, color="#ffffff")
+        mask.paste(rounding_mask, (width - rounding_mask.width + 1, 0))
+        mask_draw = ImageDraw.Draw(mask)
+        mask_draw.rectangle(xy=(width, 0, mask.width, mask.height), fill="#000000")
+        progressbar.putalpha(mask)
+
+        # join everything
+        result.alpha_composite(progressbar)
+        result.alpha_composite(self._progressbar_top)
+        return result
+
+    def generate_image(self, player: PlayerCard) -> Mee6RankImage:
         return Mee6RankImage(self, player)
 
+    def generate_leaderboard_image(self, players: Iterable[PlayerCard]) -> Image.Image:
+        """Generate image with rank cards of given players stacked on each other."""
+        cards = [self.generate_image(player) for player in players]
+        if not cards:
+            raise ValueError("At least one player is needed to generate the image.")
+        width, height = cards[0].size
+        spacing = self.LEADERBOARD_CARD_SPACING
+        result = Image.new(
+            mode="RGBA", size=(width, len(cards) * (height + spacing) - spacing)
+        )
+        for idx, card in enumerate(cards):
+            result.alpha_composite(card._result, (0, idx * (height + spacing)))
+        return result
+
 
 class MixinMeta(ABC):
     def __init__(self) -> None:
@@ -112,11 +278,10 @@ class Mee6RankImageMixin(MixinMeta):
 
 
 class Mee6RankImage(Mee6RankImageMixin):
-    def __init__(
-        self, template: Mee6RankImageTemplate, player: PlayerWithAvatar
-    ) -> None:
+    def __init__(self, template: Mee6RankImageTemplate, player: PlayerCard) -> None:
         self.template = template
         self.fonts = self.template.fonts
+        self.text = self.template.text
         self.player = player
         self._result = Image.open(self.template.card_base).convert("RGBA")
         super().__init__()
@@ -134,80 +299,64 @@ class Mee6RankImage(Mee6RankImageMixin):
 
     def _draw_level(self) -> None:
         # why do I even use templates when I still do stuff like this...
+        # captions are static so they're composited from pre-rendered stamps
         parts = {
-            "level_number": (str(self.player.level), 0, "#62d3f5"),
-            "level_caption": ("LEVEL", 6, "#62d3f5"),
-            "rank_number": (f"#{self.player.rank}", 15, "#ffffff"),
-            "rank_caption": ("RANK", 6, "#ffffff"),
+            "level_number": (str(self.player.level), 0, "#62d3f5", False),
+            "level_caption": ("LEVEL", 6, "#62d3f5", True),
+            "rank_number": (f"#{self.player.rank}", 15, "#ffffff", False),
+            "rank_caption": ("RANK", 6, "#ffffff", True),
         }
         offset_x = 0
-        for part_name, (text, offset, fill) in parts.items():
+        for part_name, (text, offset, fill, is_static) in parts.items():
             coords, font_name = self.template.get_coords(part_name)
             # all parts from dict above have font name defined
             assert isinstance(font_name, str), "mypy"
-            font = self.fonts[font_name]
-            x, offset_y = font.getsize(text)
+            x, offset_y = self.text.getsize(font_name, text)
             offset_x += x + offset
             coords -= (offset_x, offset_y)
-            self._draw.text(xy=coords, text=text, fill=fill, font=font)
+            if is_static:
+                self.text.draw_stamp(self._result, coords, font_name, text, fill)
+            else:
+                font = self.fonts[font_name]
+                self._draw.text(xy=coords, text=text, fill=fill, font=font)
 
     def _draw_username(self) -> None:
         # Username
         # TODO: fix the math here - cut long usernames,
         # change font size for longer text, etc.
-        text = self.player.member.name
+        text = self.player.name
         coords, font_name = self.template.get_coords("username")
         assert isinstance(font_name, str), "mypy"  # username has font name defined
         font = self.fonts[font_name]
-        offset_x, offset_y = font.getsize(text)
+        offset_x, offset_y = self.text.getsize(font_name, text)
         coords -= (0, offset_y)
         self._draw.text(xy=coords, text=text, fill="#fff", font=font)
         # discriminator
-        text = f"#{self.player.member.discriminator}"
+        text = f"#{self.player.discriminator}"
         coords, font_name = self.template.get_coords("discriminator")
         assert isinstance(font_name, str), "mypy"  # discriminator has font name defined
         font = self.fonts[font_name]
-        _, offset_y = font.getsize(text)
+        _, offset_y = self.text.getsize(font_name, text)
         offset_x += 10
         coords += (offset_x, -offset_y)
         self._draw.text(xy=coords, text=text, fill="#7f8384", font=font)
 
     def _draw_progressbar(self) -> None:
-        with Image.open(self.template.progressbar) as progressbar_top:
-            result = Image.new(mode="RGBA", size=progressbar_top.size, color="#484b4e")
-
-            # calculate progressbar width
-            width = int(
-                self.player.level_xp / self.player.level_total_xp * result.width
-            )
-            # progressbar should be either 0 or 36 when <36
-            # (taken from comments in Mee6's svg)
-            if width < 36 and width != 0:
-                width = 36
-
-            # make progressbar
-            progressbar = Image.new(mode="RGBA", size=result.size)
-            progressbar_draw = ImageDraw.Draw(progressbar)
-            progressbar_draw.rectangle(xy=(0, 0, width, result.height), fill="#62d3f5")
-
-            # make and apply rounding mask for end (right side) of the progressbar
-            with Image.open(self.template.progressbar_rounding_mask).convert(
-                "L"
-            ) as rounding_mask:
-                mask = Image.new(mode="L", size=progressbar.size, color="#ffffff")
-                mask.paste(rounding_mask, (width - rounding_mask.width + 1, 0))
-                mask_draw = ImageDraw.Draw(mask)
-                mask_draw.rectangle(
-                    xy=(width, 0, mask.width, mask.height), fill="#000000"
-                )
-            progressbar.putalpha(mask)
-
-            # join everything
-            result.alpha_composite(progressbar)
-            result.alpha_composite(progressbar_top)
-
-            coords, _ = self.template.get_coords("progressbar")
-            self._result.alpha_composite(result, coords.to_tuple())
+        # calculate progressbar width
+        width = int(
+            self.player.level_xp
+            / self.player.level_total_xp
+            * self.template.progressbar_width
+        )
+        # progressbar should be either 0 or 36 when <36
+        # (taken from comments in Mee6's svg)
+        if width < 36 and width != 0:
+            width = 36
+
+        coords, _ = self.template.get_coords("progressbar")
+        self._result.alpha_composite(
+            self.template.get_progressbar(width), coords.to_tuple()
+        )
 
     def _draw_xp(self) -> None:
         # why do I even use templates when I still do stuff like this...
@@ -225,16 +374,12 @@ class Mee6RankImage(Mee6RankImageMixin):
             # all parts from dict above have font name defined
             assert isinstance(font_name, str), "mypy"
             font = self.fonts[font_name]
-            x, offset_y = font.getsize(text)
+            x, offset_y = self.text.getsize(font_name, text)
             offset_x += x + offset
             coords -= (offset_x, offset_y)
             self._draw.text(xy=coords, text=text, fill=fill, font=font)
 
     def _draw_avatar(self) -> None:
-        with Image.open(self.template.avatar_mask).convert("L") as avatar_mask:
-            avatar_file = self.player.avatar
-            avatar_file.seek(0)
-            avatar = Image.open(avatar_file)
-            avatar_output = ImageOps.fit(avatar, avatar_mask.size, centering=(0.5, 0.5))
-            avatar_output.putalpha(avatar_mask)
-            self._result.alpha_composite(avatar_output, (40, 60))
+        # avatar is already fitted and masked by `Mee6RankImageTemplate.prepare_avatar`
+        coords, _ = self.template.get_coords("avatar")
+        self._result.alpha_composite(self.player.avatar, coords.to_tuple())
@@ -0,0 +1,451 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .stats import LeaderboardColumns
+
+__all__ = ("PAGE_SIZE", "LeaderboardSnapshot", "LeaderboardCache")
+
+log = logging.getLogger("red.jackcogs.mee6rank.leaderboard")
+
+# amount of players on a single page of Mee6 leaderboard
+PAGE_SIZE = 999
+# keys of player data that are kept in the snapshot, the rest is thrown away
+PLAYER_DATA_KEYS = ("id", "level", "xp", "detailed_xp", "message_count")
+
+FetchPage = Callable[[int, int], Awaitable[Dict[str, Any]]]
+
+
+class LeaderboardSnapshot:
+    """
+    Snapshot of whole Mee6 leaderboard of a guild.
+
+    Player data dicts have an additional ``rank`` key
+    with player's position on the leaderboard.
+    """
+
+    __slots__ = ("guild_id", "players", "role_rewards", "created_at", "_columns")
+
+    def __init__(
+        self,
+        guild_id: int,
+        players: Dict[int, Dict[str, Any]],
+        role_rewards: List[Dict[str, Any]],
+    ) -> None:
+        self.guild_id = guild_id
+        # member ID -> player data
+        self.players = players
+        self.role_rewards = role_rewards
+        self.created_at = time.monotonic()
+        self._columns: Optional[LeaderboardColumns] = None
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def get_player_data(self, member_id: int) -> Optional[Dict[str, Any]]:
+        return self.players.get(member_id)
+
+    @property
+    def age(self) -> float:
+        """Age of the snapshot in seconds."""
+        return time.monotonic() - self.created_at
+
+    def is_expired(self, ttl: float) -> bool:
+        return self.age >= ttl
+
+    def get_columns(self) -> LeaderboardColumns:
+        """
+        Get sorted columns of the leaderboard, building them on first use.
+
+        This can take a while on big leaderboards and should be ran in an executor.
+        """
+        if self._columns is None:
+            self._columns = LeaderboardColumns(self.players.values())
+        return self._columns
+
+
+def _make_player_data(raw_player_data: Dict[str, Any], rank: int) -> Dict[str, Any]:
+    player_data = {
+        key: raw_player_data[key] for key in PLAYER_DATA_KEYS if key in raw_player_data
+    }
+    player_data["rank"] = rank
+    return player_data
+
+
+class _PlayerSearch:
+    """
+    Search for a single player on the leaderboard.
+
+    When player's XP from stale snapshot is known, it is used to find the right page.
+    Leaderboard is sorted by XP and player's XP can only grow,
+    so the player is either on the first page with players that have
+    less (or equal) XP than the player had, or on one of the pages above it.
+    """
+
+    def __init__(
+        self,
+        fetch_page: Callable[[int, int], Awaitable[Tuple[int, Dict[str, Any]]]],
+        guild_id: int,
+        member_id: int,
+        *,
+        max_requests: int,
+        max_scanned_pages: int,
+    ) -> None:
+        self._fetch_page = fetch_page
+        self.guild_id = guild_id
+        self.member_id = str(member_id)
+        self.max_requests = max_requests
+        self.max_scanned_pages = max_scanned_pages
+        self._pages: Dict[int, List[Dict[str, Any]]] = {}
+        self.role_rewards: List[Dict[str, Any]] = []
+        self.player_data: Optional[Dict[str, Any]] = None
+
+    async def run(self, xp: int, rank: int) -> bool:
+        """
+        Runs the search, starting at the page on which the player was before.
+
+        Returns `False`, if the player couldn't be found within the request limit.
+        """
+        try:
+            lo, hi = await self._find_bounds(xp, (rank - 1) // PAGE_SIZE)
+            # bisect to the first page on which the player could be
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if await self._is_at_or_below(mid, xp):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            # the player could have moved up from there if they gained XP since
+            for page in range(hi, max(-1, hi - self.max_scanned_pages), -1):
+                await self._fetch(page)
+        except _PlayerFound:
+            return True
+        except _RequestLimitReached:
+            return False
+        return False
+
+    async def scan(self) -> bool:
+        """
+        Scans the leaderboard page by page from the top,
+        until the player or the end of the leaderboard is found.
+
+        Pages already fetched by `run()` are not fetched again.
+
+        Returns `False`, if the player isn't on the leaderboard.
+        """
+        page = 0
+        try:
+            while await self._fetch(page, bounded=False):
+                page += 1
+        except _PlayerFound:
+            return True
+        return False
+
+    async def _find_bounds(self, xp: int, probe: int) -> Tuple[int, int]:
+        if await self._is_at_or_below(probe, xp):
+            return 0, probe
+        # gallop down the leaderboard until we get past the player's XP
+        lo = probe + 1
+        step = 1
+        while not await self._is_at_or_below(probe + step, xp):
+            lo = probe + step + 1
+            step *= 2
+        return lo, probe + step
+
+    async def _is_at_or_below(self, page: int, xp: int) -> bool:
+        # empty page (past the end of the leaderboard) is considered to be below
+        players = await self._fetch(page)
+        return not players or players[-1]["xp"] <= xp
+
+    async def _fetch(self, page: int, *, bounded: bool = True) -> List[Dict[str, Any]]:
+        if (cached_players := self._pages.get(page)) is not None:
+            return cached_players
+        if bounded and len(self._pages) >= self.max_requests:
+            raise _RequestLimitReached
+        _, leaderboard = await self._fetch_page(self.guild_id, page)
+        self.role_rewards = leaderboard["role_rewards"]
+        players: List[Dict[str, Any]] = leaderboard["players"]
+        if bounded:
+            # only the pages used by the bisect need to be kept
+            self._pages[page] = players
+        for rank, raw_player_data in enumerate(players, page * PAGE_SIZE + 1):
+            if raw_player_data["id"] == self.member_id:
+                self.player_data = _make_player_data(raw_player_data, rank)
+                raise _PlayerFound
+        return players
+
+
+class _PlayerFound(Exception):
+    pass
+
+
+class _RequestLimitReached(Exception):
+    pass
+
+
+class LeaderboardCache:
+    """
+    Per-guild cache of leaderboard snapshots.
+
+    When a snapshot is missing or expired, a single refresh is started for the guild
+    and all lookups made in the meantime wait for that refresh.
+
+    Single player lookups never wait for the refresh. If the player
+    is in the expired snapshot, their XP is used to find the right page
+    with a probe-and-bisect search, otherwise the leaderboard is scanned
+    from the top until the player is found. The refresh is only started
+    in the background afterwards, if the snapshots are kept at all (ttl > 0).
+    """
+
+    # max amount of leaderboard pages fetched at once (across all guilds)
+    MAX_CONCURRENT_REQUESTS = 4
+    # for how long (in seconds) expired snapshots are kept for searching players
+    STALE_SNAPSHOT_TTL = 24 * 60 * 60
+    # max amount of pages fetched by a single player search
+    MAX_SEARCH_REQUESTS = 16
+    # max amount of pages above the player's previous XP checked by the search
+    MAX_SEARCH_SCANNED_PAGES = 3
+
+    def __init__(self, fetch_page: FetchPage, *, ttl: int) -> None:
+        self._fetch_page = fetch_page
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        self._snapshots: Dict[int, LeaderboardSnapshot] = {}
+        self._refresh_tasks: Dict[int, "asyncio.Task[LeaderboardSnapshot]"] = {}
+        # refresh tasks that might finish without anyone waiting for them
+        self._background_refreshes: Set["asyncio.Task[LeaderboardSnapshot]"] = set()
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def clear(self) -> None:
+        self._snapshots.clear()
+
+    def cancel_refreshes(self) -> None:
+        for task in self._refresh_tasks.values():
+            task.cancel()
+
+    async def get_snapshot(self, guild_id: int) -> LeaderboardSnapshot:
+        """
+        Gets leaderboard snapshot of the guild with given ID.
+
+        Raises
+        ------
+        HTTPException
+            Raised when the API returned error response.
+        """
+        self._remove_stale()
+        snapshot = self._snapshots.get(guild_id)
+        if snapshot is not None and not snapshot.is_expired(self.ttl):
+            return snapshot
+
+        # shielded so that cancelling one of the waiters doesn't affect the others
+        return await asyncio.shield(self._get_refresh_task(guild_id))
+
+    def get_cached_snapshot(self, guild_id: int) -> Optional[LeaderboardSnapshot]:
+        """
+        Gets leaderboard snapshot of the guild with given ID without fetching it.
+
+        The returned snapshot may be expired.
+        """
+        self._remove_stale()
+        return self._snapshots.get(guild_id)
+
+    async def get_player_data(
+        self, guild_id: int, member_id: int
+    ) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Gets player data of given member and role rewards of the guild.
+
+        Player data is `None`, if the member isn't on the leaderboard.
+
+        Raises
+        ------
+        HTTPException
+            Raised when the API returned error response.
+        """
+        self._remove_stale()
+        snapshot = self._snapshots.get(guild_id)
+        player_data = None
+        if snapshot is not None:
+            player_data = snapshot.get_player_data(member_id)
+            if not snapshot.is_expired(self.ttl):
+                return player_data, snapshot.role_rewards
+
+        search = _PlayerSearch(
+            self._fetch_page_bounded,
+            guild_id,
+            member_id,
+            max_requests=self.MAX_SEARCH_REQUESTS,
+            max_scanned_pages=self.MAX_SEARCH_SCANNED_PAGES,
+        )
+        found = False
+        if player_data is not None:
+            found = await search.run(player_data["xp"], player_data["rank"])
+        if not found:
+            found = await search.scan()
+
+        if self.ttl > 0:
+            self._detach_refresh_task(self._get_refresh_task(guild_id))
+        if not found:
+            return None, search.role_rewards
+        return search.player_data, search.role_rewards
+
+    async def get_top_players(
+        self, guild_id: int
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Gets player data of players from the first page of the leaderboard
+        (sorted by rank) and role rewards of the guild.
+
+        Players are taken from the snapshot if it isn't expired,
+        otherwise only the first page of the leaderboard is fetched.
+
+        Raises
+        ------
+        HTTPException
+            Raised when the API returned error response.
+        """
+        self._remove_stale()
+        snapshot = self._snapshots.get(guild_id)
+        if snapshot is not None and not snapshot.is_expired(self.ttl):
+            players = [
+                player_data
+                for player_data in snapshot.players.values()
+                if player_data["rank"] <= PAGE_SIZE
+            ]
+            players.sort(key=lambda player_data: player_data["rank"])
+            return players, snapshot.role_rewards
+
+        _, leaderboard = await self._fetch_page_bounded(guild_id, 0)
+        players = [
+            _make_player_data(raw_player_data, rank)
+            for rank, raw_player_data in enumerate(leaderboard["players"], 1)
+        ]
+        return players, leaderboard["role_rewards"]
+
+    def _get_refresh_task(self, guild_id: int) -> "asyncio.Task[LeaderboardSnapshot]":
+        if (task := self._refresh_tasks.get(guild_id)) is None:
+            task = asyncio.create_task(self._refresh(guild_id))
+            self._refresh_tasks[guild_id] = task
+        return task
+
+    def _detach_refresh_task(self, task: "asyncio.Task[LeaderboardSnapshot]") -> None:
+        """Makes sure that the error of refresh that isn't awaited gets logged."""
+        if task not in self._background_refreshes:
+            self._background_refreshes.add(task)
+            task.add_done_callback(self._on_background_refresh_done)
+
+    def _on_background_refresh_done(
+        self, task: "asyncio.Task[LeaderboardSnapshot]"
+    ) -> None:
+        self._background_refreshes.discard(task)
+        if not task.cancelled() and (exc := task.exception()) is not None:
+            log.error(
+                "Background refresh of leaderboard snapshot failed.", exc_info=exc
+            )
+
+    def _remove_stale(self) -> None:
+        stale = [
+            guild_id
+            for guild_id, snapshot in self._snapshots.items()
+            if snapshot.is_expired(max(self.ttl, self.STALE_SNAPSHOT_TTL))
+        ]
+        for guild_id in stale:
+            del self._snapshots[guild_id]
+
+    async def _refresh(self, guild_id: int) -> LeaderboardSnapshot:
+        try:
+            snapshot = await self._fetch_snapshot(guild_id)
+        finally:
+            del self._refresh_tasks[guild_id]
+        log.debug(
+            "Fetched leaderboard snapshot with %s players for guild with ID %s.",
+            len(snapshot),
+            guild_id,
+        )
+        if self.ttl > 0:
+            self._snapshots[guild_id] = snapshot
+        return snapshot
+
+    async def _fetch_snapshot(self, guild_id: int) -> LeaderboardSnapshot:
+        """
+        Crawls the leaderboard, fetching multiple pages concurrently.
+
+        Pages are added to the snapshot as soon as they're fetched
+        so that only the players' data is kept rather than all the responses.
+        """
+        players: Dict[int, Dict[str, Any]] = {}
+        role_rewards: List[Dict[str, Any]] = []
+        # page number of the first empty page, i.e. the end of the leaderboard
+        end: Optional[int] = None
+        next_page = 0
+        pending: Dict["asyncio.Task[Tuple[int, Dict[str, Any]]]", int] = {}
+        try:
+            while True:
+                while end is None and len(pending) < self.MAX_CONCURRENT_REQUESTS:
+                    task = asyncio.create_task(
+                        self._fetch_page_bounded(guild_id, next_page)
+                    )
+                    pending[task] = next_page
+                    next_page += 1
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    del pending[task]
+                    page, leaderboard = task.result()
+                    role_rewards = leaderboard["role_rewards"]
+                    if not (page_players := leaderboard["players"]):
+                        if end is None or page < end:
+                            end = page
+                        continue
+                    if end is not None and page > end:
+                        continue
+                    self._add_page(players, page, page_players)
+
+                if end is not None:
+                    # pages after the end are empty, no need to wait for them
+                    for task, page in list(pending.items()):
+                        if page > end:
+                            task.cancel()
+                            del pending[task]
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return LeaderboardSnapshot(guild_id, players, role_rewards)
+
+    async def _fetch_page_bounded(
+        self, guild_id: int, page: int
+    ) -> Tuple[int, Dict[str, Any]]:
+        async with self._semaphore:
+            return page, await self._fetch_page(guild_id, page)
+
+    @staticmethod
+    def _add_page(
+        players: Dict[int, Dict[str, Any]],
+        page: int,
+        page_players: List[Dict[str, Any]],
+    ) -> None:
+        for rank, raw_player_data in enumerate(page_players, page * PAGE_SIZE + 1):
+            player_data = _make_player_data(raw_player_data, rank)
+            players[int(player_data["id"])] = player_data
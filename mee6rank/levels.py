@@ -0,0 +1,97 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import random
+import time
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, List, Tuple
+
+__all__ = (
+    "MAX_TABLE_LEVEL",
+    "TOTAL_XP_TABLE",
+    "total_xp_for_level",
+    "level_from_xp",
+    "benchmark_levels",
+)
+
+# highest level in the precomputed table, levels above it are calculated on demand
+MAX_TABLE_LEVEL = 1000
+
+
+def _calculate_total_xp(level: int) -> int:
+    # formula taken from https://github.com/PsKramer/mee6calc/blob/master/calc.js
+    return math.ceil(5 / 6 * level * (2 * level * level + 27 * level + 91))
+
+
+# total XP needed to reach the level at given index
+TOTAL_XP_TABLE = array(
+    "q", (_calculate_total_xp(level) for level in range(MAX_TABLE_LEVEL + 1))
+)
+
+
+def total_xp_for_level(level: int) -> int:
+    """Get total amount of XP needed to reach given level."""
+    if level <= MAX_TABLE_LEVEL:
+        return TOTAL_XP_TABLE[level]
+    return _calculate_total_xp(level)
+
+
+def level_from_xp(total_xp: int) -> int:
+    """Get level reached with given total amount of XP."""
+    if total_xp < TOTAL_XP_TABLE[-1]:
+        return bisect_right(TOTAL_XP_TABLE, total_xp) - 1
+    level = MAX_TABLE_LEVEL
+    while _calculate_total_xp(level + 1) <= total_xp:
+        level += 1
+    return level
+
+
+def _level_from_xp_linear(total_xp: int) -> int:
+    # naive approach that `level_from_xp()` is compared against in the benchmark
+    level = 0
+    while _calculate_total_xp(level + 1) <= total_xp:
+        level += 1
+    return level
+
+
+def _measure(func: Callable[[int], int], values: List[int]) -> float:
+    start = time.perf_counter()
+    for value in values:
+        func(value)
+    return time.perf_counter() - start
+
+
+def benchmark_levels(players: int = 100_000) -> Dict[str, Tuple[float, float]]:
+    """
+    Compare the precomputed table lookups with calculating levels on the fly
+    for given amount of players with random levels.
+
+    Returns dict mapping operation name to
+    ``(time with table, time without table)`` tuple (in seconds).
+    """
+    rng = random.Random(0)
+    levels = [rng.randrange(100) for _ in range(players)]
+    total_xp = [total_xp_for_level(level) + rng.randrange(100) for level in levels]
+    return {
+        "total XP for level": (
+            _measure(total_xp_for_level, levels),
+            _measure(_calculate_total_xp, levels),
+        ),
+        "level from XP": (
+            _measure(level_from_xp, total_xp),
+            _measure(_level_from_xp_linear, total_xp),
+        ),
+    }
@@ -18,21 +18,29 @@ import logging
 import math
 from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import Any, Callable, Dict, Literal, TypeVar, Union, overload
+from typing import Any, Callable, Dict, List, Literal, TypeVar, Union, cast, overload
 
 import aiohttp
 import discord
-from PIL import ImageFont
+from PIL import Image, ImageFont
 from redbot.core import commands
 from redbot.core.bot import Red
 from redbot.core.commands import NoParseOptional as Optional
+from redbot.core.config import Config
 from redbot.core.data_manager import bundled_data_path
+from redbot.core.utils.chat_formatting import box, humanize_number, humanize_timedelta
 
 from . import errors
+from .avatars import AvatarCache, AvatarKey
+from .encoders import DEFAULT_ENCODER, ENCODERS, benchmark_encoders, get_encoder
 from .figures import Point
-from .image import CoordsInfo, Mee6RankImageTemplate
+from .image import CoordsInfo, Mee6RankImageTemplate, PlayerCard
+from .leaderboard import PAGE_SIZE, LeaderboardCache, LeaderboardSnapshot
+from .levels import benchmark_levels, level_from_xp
 from .player import Player, PlayerWithAvatar
-from .utils import json_or_text
+from .rendering import RENDER_BACKENDS, ImageRenderer, RenderBackend
+from .stats import Bucket, LeaderboardColumns
+from .utils import backoff_delay, get_retry_after, json_or_text
 
 log = logging.getLogger("red.jackcogs.mee6rank")
 
@@ -46,6 +54,20 @@ class Mee6Rank(commands.Cog):
     MIN_XP_GAIN = 15
     MAX_XP_GAIN = 25
     AVG_XP_GAIN = (MIN_XP_GAIN + MAX_XP_GAIN) / 2
+    # max amount of tries and the delays (in seconds) used for retrying requests
+    MAX_REQUEST_TRIES = 5
+    RETRY_BASE_DELAY = 1
+    RETRY_MAX_DELAY = 30
+    # default TTL (in seconds) of guild leaderboard snapshots
+    DEFAULT_LEADERBOARD_TTL = 300
+    # max amount of players on the `[p]mee6top` image
+    MAX_TOP_PLAYERS = 10
+    # max amount of avatars downloaded at once by `[p]mee6top`
+    MAX_CONCURRENT_AVATAR_FETCHES = 5
+    # percentiles of total XP shown by `[p]mee6stats`
+    STATS_PERCENTILES = (10, 25, 50, 75, 90, 99)
+    # max size (in bytes) of the decoded avatars kept in the avatar cache
+    AVATAR_CACHE_SIZE = 16 * 1024 * 1024
     COORDS = {
         "level_number": CoordsInfo(Point(882, 100), "Poppins60"),
         "level_caption": CoordsInfo(Point(882, 100), "Poppins24"),
@@ -64,6 +86,19 @@ class Mee6Rank(commands.Cog):
         self._session = aiohttp.ClientSession()
         self.bot = bot
         self.loop: asyncio.AbstractEventLoop = bot.loop
+        self.config = Config.get_conf(
+            self, identifier=176070082584248320, force_registration=True
+        )
+        self.config.register_global(
+            image_encoder=DEFAULT_ENCODER.name,
+            leaderboard_ttl=self.DEFAULT_LEADERBOARD_TTL,
+            render_backend="thread",
+            render_pool_size=None,
+        )
+        self._leaderboard = LeaderboardCache(
+            self._request, ttl=self.DEFAULT_LEADERBOARD_TTL
+        )
+        self._avatar_cache = AvatarCache(self.AVATAR_CACHE_SIZE)
         self._executor = ThreadPoolExecutor()
         self.bundled_data_path = bundled_data_path(self)
         self.fonts = {
@@ -90,9 +125,18 @@ class Mee6Rank(commands.Cog):
             ),
             avatar_mask=self.bundled_data_path / "avatar_mask.png",
         )
+        self._renderer = ImageRenderer(self.loop, self.template)
+
+    async def initialize(self) -> None:
+        self._leaderboard.ttl = await self.config.leaderboard_ttl()
+        self._renderer.configure(
+            await self.config.render_backend(), await self.config.render_pool_size()
+        )
 
     def cog_unload(self) -> None:
+        self._leaderboard.cancel_refreshes()
         self._session.detach()
+        self._renderer.shutdown()
 
     __del__ = cog_unload
 
@@ -103,8 +147,8 @@ class Mee6Rank(commands.Cog):
     async def red_delete_data_for_user(
         self, *, requester: RequestType, user_id: int
     ) -> None:
-        # this cog does not story any data
-        pass
+        # this cog does not story any data, apart from in-memory cache of avatars
+        self._avatar_cache.remove_user(user_id)
 
     async def _run_in_executor(
         self, func: Callable[..., T], *args: Any, **kwargs: Any
@@ -150,13 +194,6 @@ class Mee6Rank(commands.Cog):
                 )
             await ctx.send(embed=embed)
 
-    def _generate_image(self, player: PlayerWithAvatar) -> BytesIO:
-        image = self.template.generate_image(player)
-        fp = BytesIO()
-        image.save(fp, format="PNG", quality=100)
-        fp.seek(0)
-        return fp
-
     @commands.guild_only()
     @commands.bot_has_permissions(attach_files=True)
     @commands.cooldown(rate=1, per=5, type=commands.BucketType.member)
@@ -174,16 +211,284 @@ class Mee6Rank(commands.Cog):
         ) is None:
             return
 
-        fp = await self._run_in_executor(self._generate_image, player)
+        encoder = get_encoder(await self.config.image_encoder())
+        data = await self._renderer.render(PlayerCard.from_player(player), encoder)
+
+        await ctx.send(
+            file=discord.File(BytesIO(data), filename=f"card.{encoder.extension}")
+        )
+
+    @commands.guild_only()
+    @commands.bot_has_permissions(attach_files=True)
+    @commands.cooldown(rate=1, per=30, type=commands.BucketType.guild)
+    @commands.command()
+    async def mee6top(self, ctx: commands.GuildContext, amount: int = 10) -> None:
+        """
+        Get an image with Mee6 rank cards of top members of this guild.
+
+        Members that left the guild are skipped.
+        `amount` has to be in range 1-10.
+        """
+        if not 1 <= amount <= self.MAX_TOP_PLAYERS:
+            await ctx.send(f"Amount has to be in range 1-{self.MAX_TOP_PLAYERS}.")
+            return
+
+        async with ctx.typing():
+            try:
+                players = await self._get_top_players(ctx.guild, amount)
+            except errors.GuildNotFound:
+                await ctx.send("There's no Mee6 leaderboard for this guild.")
+                return
+            except errors.HTTPException as e:
+                await self._send_http_error(ctx, e)
+                return
+            if not players:
+                await ctx.send("I wasn't able to find any Mee6 ranks in this guild.")
+                return
+
+            encoder = get_encoder(await self.config.image_encoder())
+            data = await self._renderer.render_leaderboard(
+                tuple(map(PlayerCard.from_player, players)), encoder
+            )
+
+        await ctx.send(
+            file=discord.File(BytesIO(data), filename=f"top.{encoder.extension}")
+        )
+
+    @commands.guild_only()
+    @commands.cooldown(rate=1, per=30, type=commands.BucketType.guild)
+    @commands.command()
+    async def mee6stats(self, ctx: commands.GuildContext) -> None:
+        """
+        Get statistics about Mee6 leaderboard of this guild.
+
+        Statistics are calculated from the last fetched leaderboard,
+        the leaderboard is only fetched, if there's none.
+        """
+        async with ctx.typing():
+            snapshot = self._leaderboard.get_cached_snapshot(ctx.guild.id)
+            if snapshot is None:
+                try:
+                    snapshot = await self._leaderboard.get_snapshot(ctx.guild.id)
+                except errors.GuildNotFound:
+                    await ctx.send("There's no Mee6 leaderboard for this guild.")
+                    return
+                except errors.HTTPException as e:
+                    await self._send_http_error(ctx, e)
+                    return
+            if not snapshot:
+                await ctx.send("Mee6 leaderboard of this guild is empty.")
+                return
+
+            columns = await self._run_in_executor(snapshot.get_columns)
+            msg = self._format_stats(ctx.guild, snapshot, columns)
+        await ctx.send(msg)
+
+    def _format_stats(
+        self,
+        guild: discord.Guild,
+        snapshot: LeaderboardSnapshot,
+        columns: LeaderboardColumns,
+    ) -> str:
+        total = len(columns)
+
+        def format_buckets(buckets: List[Bucket]) -> List[str]:
+            return [
+                f"{f'{low}-{high - 1}':<12}"
+                f"{humanize_number(count):>10}{count / total:>9.1%}"
+                for low, high, count in buckets
+            ]
+
+        lines = ["Levels:"]
+        lines.extend(format_buckets(columns.level_histogram()))
+        lines.append("\nTotal XP percentiles:")
+        for percent in self.STATS_PERCENTILES:
+            total_xp = columns.percentile(columns.total_xp, percent)
+            lines.append(
+                f"{f'{percent}th':<12}{humanize_number(total_xp):>10}"
+                f"  (level {level_from_xp(total_xp)})"
+            )
+        lines.append("\nMessages:")
+        lines.extend(format_buckets(columns.message_count_histogram()))
+
+        role_reward_lines = []
+        for role_reward in sorted(snapshot.role_rewards, key=lambda data: data["rank"]):
+            role = guild.get_role(int(role_reward["role"]["id"]))
+            if role is None:
+                continue
+            count = columns.count_below_level(role_reward["rank"])
+            role_reward_lines.append(
+                f"{role.name} (level {role_reward['rank']}):"
+                f" {humanize_number(count)} ({count / total:.1%})"
+            )
+        if role_reward_lines:
+            lines.append("\nMembers below role rewards:")
+            lines.extend(role_reward_lines)
+
+        age = humanize_timedelta(seconds=int(snapshot.age)) or "less than a second"
+        return (
+            f"**Mee6 leaderboard statistics for {guild.name}**\n"
+            f"{humanize_number(total)} members on the leaderboard,"
+            f" data from {age} ago.\n" + box("\n".join(lines))
+        )
+
+    @commands.is_owner()
+    @commands.group()
+    async def mee6rankset(self, ctx: commands.Context) -> None:
+        """Mee6Rank configuration options."""
+
+    @mee6rankset.command(name="encoder")
+    async def mee6rankset_encoder(
+        self, ctx: commands.Context, encoder_name: Optional[str] = None
+    ) -> None:
+        """
+        Set the format in which rank images are encoded and uploaded.
+
+        Use `[p]mee6rankset benchmark` to compare encoding time
+        and file size of the available encoders.
+
+        Leave empty to list the available encoders.
+        """
+        if encoder_name is None:
+            current_encoder = get_encoder(await self.config.image_encoder())
+            lines = [
+                f"`{encoder.name}` - {encoder.description}"
+                for encoder in ENCODERS.values()
+                if encoder.available
+            ]
+            await ctx.send(
+                f"Current encoder: `{current_encoder.name}`\n\n"
+                "Available encoders:\n" + "\n".join(lines)
+            )
+            return
+
+        encoder = ENCODERS.get(encoder_name.lower())
+        if encoder is None or not encoder.available:
+            await ctx.send(
+                "There's no encoder with this name available,"
+                f" use `{ctx.clean_prefix}mee6rankset encoder` to list them."
+            )
+            return
+
+        await self.config.image_encoder.set(encoder.name)
+        await ctx.send(f"Rank images will now be encoded using `{encoder.name}`.")
+
+    @mee6rankset.command(name="benchmark")
+    async def mee6rankset_benchmark(self, ctx: commands.Context) -> None:
+        """Compare encoding time and file size of the available encoders."""
+        async with ctx.typing():
+            with Image.open(self.template.card_base) as card_base:
+                image = card_base.convert("RGBA")
+            results = await self._run_in_executor(benchmark_encoders, image)
+        lines = [
+            f"{encoder.name:<14}{elapsed * 1000:>8.1f} ms{size / 1024:>10.1f} KiB"
+            for encoder, elapsed, size in results
+        ]
+        await ctx.send("**Rank card base**\n" + box("\n".join(lines)))
+
+    @mee6rankset.command(name="levelsbenchmark")
+    async def mee6rankset_levelsbenchmark(
+        self, ctx: commands.Context, players: int = 100_000
+    ) -> None:
+        """Compare level calculations with and without the precomputed XP table."""
+        if not 1 <= players <= 1_000_000:
+            await ctx.send("Amount of players has to be in range 1-1000000.")
+            return
+        async with ctx.typing():
+            results = await self._run_in_executor(benchmark_levels, players)
+        lines = [
+            f"{name:<20}{with_table * 1000:>8.1f} ms{without_table * 1000:>10.1f} ms"
+            for name, (with_table, without_table) in results.items()
+        ]
+        await ctx.send(
+            f"**Level calculations for {humanize_number(players)} players**\n"
+            + box("\n".join([f"{'':<20}{'table':>11}{'formula':>13}", *lines]))
+        )
+
+    @mee6rankset.command(name="renderbackend")
+    async def mee6rankset_renderbackend(
+        self, ctx: commands.Context, backend: Optional[str] = None
+    ) -> None:
+        """
+        Set whether rank images should be rendered in threads or processes.
 
-        await ctx.send(file=discord.File(fp, filename="card.png"))
+        Process backend renders images in separate worker processes,
+        which keeps the bot responsive when many images are rendered at once,
+        at the cost of higher memory usage.
+
+        Accepted values are `thread` and `process`.
+        Leave empty to reset to default (`thread`).
+        """
+        if backend is None:
+            await self.config.render_backend.clear()
+            backend = await self.config.render_backend()
+        else:
+            backend = backend.lower()
+            if backend not in RENDER_BACKENDS:
+                await ctx.send("Backend has to be either `thread` or `process`.")
+                return
+            await self.config.render_backend.set(backend)
+
+        self._renderer.configure(
+            cast(RenderBackend, backend), await self.config.render_pool_size()
+        )
+        await ctx.send(f"Rank images will now be rendered using {backend} backend.")
+
+    @mee6rankset.command(name="renderpoolsize")
+    async def mee6rankset_renderpoolsize(
+        self, ctx: commands.Context, pool_size: Optional[int] = None
+    ) -> None:
+        """
+        Set the amount of threads/processes used for rendering rank images.
+
+        Pool size needs to be in range 1-32.
+        Leave empty to reset to default (depends on the amount of CPUs).
+        """
+        if pool_size is None:
+            await self.config.render_pool_size.clear()
+        elif not 1 <= pool_size <= 32:
+            await ctx.send("Pool size has to be in range 1-32.")
+            return
+        else:
+            await self.config.render_pool_size.set(pool_size)
+
+        self._renderer.configure(self._renderer.backend, pool_size)
+        if pool_size is None:
+            await ctx.send("Pool size for rendering rank images reset to default.")
+        else:
+            await ctx.send(f"Pool size for rendering rank images set to {pool_size}.")
+
+    @mee6rankset.command(name="leaderboardttl")
+    async def mee6rankset_leaderboardttl(
+        self, ctx: commands.Context, ttl: Optional[int] = None
+    ) -> None:
+        """
+        Set for how many seconds the snapshots of guild leaderboards are cached.
+
+        All rank lookups in a guild are served from a single snapshot
+        of its leaderboard until it expires.
+        Use 0 to disable caching.
+        Leave empty to reset to default (300 seconds).
+        """
+        if ttl is None:
+            await self.config.leaderboard_ttl.clear()
+            ttl = await self.config.leaderboard_ttl()
+        elif not 0 <= ttl <= 86400:
+            await ctx.send("TTL has to be in range 0-86400 seconds.")
+            return
+        else:
+            await self.config.leaderboard_ttl.set(ttl)
+
+        self._leaderboard.ttl = ttl
+        self._leaderboard.clear()
+        await ctx.send(f"Guild leaderboards will now be cached for {ttl} seconds.")
 
     async def _request(self, guild_id: int, page: int) -> Dict[str, Any]:
         url = (
             "https://mee6.xyz/api/plugins/levels/leaderboard/"
-            f"{guild_id}?page={page}&limit=999"
+            f"{guild_id}?page={page}&limit={PAGE_SIZE}"
         )
-        for tries in range(5):
+        for tries in range(self.MAX_REQUEST_TRIES):
             async with self._session.get(url) as resp:
                 data = await json_or_text(resp)
                 if 300 > resp.status >= 200:
@@ -193,13 +498,26 @@ class Mee6Rank(commands.Cog):
                 if resp.status == 404:
                     raise errors.GuildNotFound(resp, data)
 
-                # received 500 or 502 error, API has some troubles, retrying
-                if resp.status in {500, 502}:
-                    # maybe switch this to exponential backoff someday...
-                    await asyncio.sleep(1 + tries * 2)
-                    continue
-                raise errors.HTTPException(resp, data)
-        # still failed after 5 tries
+                delay = backoff_delay(
+                    tries, base=self.RETRY_BASE_DELAY, max_delay=self.RETRY_MAX_DELAY
+                )
+                if resp.status == 429:
+                    # we're being rate limited, wait for as long as we're told to
+                    retry_after = get_retry_after(resp, data)
+                    if retry_after is not None:
+                        delay = retry_after
+                # API has some troubles, retrying
+                elif resp.status not in {500, 502, 503, 504}:
+                    raise errors.HTTPException(resp, data)
+
+            if tries + 1 < self.MAX_REQUEST_TRIES:
+                log.debug(
+                    "Request to Mee6 API failed with status %s, retrying in %.2fs.",
+                    resp.status,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+        # still failed after all tries
         raise errors.HTTPException(resp, data)
 
     @overload
@@ -234,16 +552,7 @@ class Mee6Rank(commands.Cog):
         except errors.GuildNotFound:
             await ctx.send("There's no Mee6 leaderboard for this guild.")
         except errors.HTTPException as e:
-            log.error(str(e))
-            if e.status >= 500:
-                await ctx.send(
-                    "Mee6 API experiences some issues right now. Try again later."
-                )
-            else:
-                await ctx.send(
-                    "Mee6 API can't process this request."
-                    " If this keeps happening, inform bot's owner about this error."
-                )
+            await self._send_http_error(ctx, e)
         else:
             if player is not None:
                 return player
@@ -255,6 +564,20 @@ class Mee6Rank(commands.Cog):
 
         return None
 
+    async def _send_http_error(
+        self, ctx: commands.GuildContext, error: errors.HTTPException
+    ) -> None:
+        log.error(str(error))
+        if error.status >= 500:
+            await ctx.send(
+                "Mee6 API experiences some issues right now. Try again later."
+            )
+        else:
+            await ctx.send(
+                "Mee6 API can't process this request."
+                " If this keeps happening, inform bot's owner about this error."
+            )
+
     @overload
     async def _get_player(
         self, member: discord.Member, *, get_avatar: Literal[True] = ...
@@ -279,30 +602,68 @@ class Mee6Rank(commands.Cog):
         HTTPException
             Raised when the API returned error response.
         """
-        player_data: Optional[Dict[str, Any]] = None
-        page = 0
-        guild_id = member.guild.id
-        while player_data is None:
-            leaderboard = await self._request(guild_id, page)
-            players = leaderboard["players"]
-            if not players:
-                return None
-
-            for idx, p in enumerate(players, 1):
-                if p["id"] == str(member.id):
-                    player_data = p
-                    player_data["rank"] = page * 999 + idx
-                    break
-            page += 1
+        player_data, role_rewards = await self._leaderboard.get_player_data(
+            member.guild.id, member.id
+        )
+        if player_data is None:
+            return None
 
         if get_avatar:
-            avatar = BytesIO(await member.avatar_url_as(format="png").read())
-            avatar.name = f"{member.id}.png"
-            return PlayerWithAvatar(
-                player_data, member, leaderboard["role_rewards"], avatar
-            )
+            avatar = await self._get_avatar(member)
+            return PlayerWithAvatar(player_data, member, role_rewards, avatar)
+
+        return Player(player_data, member, role_rewards)
 
-        return Player(player_data, member, leaderboard["role_rewards"])
+    async def _get_top_players(
+        self, guild: discord.Guild, amount: int
+    ) -> List[PlayerWithAvatar]:
+        """
+        Gets Mee6 player objects of top members of the guild.
+
+        Raises
+        ------
+        HTTPException
+            Raised when the API returned error response.
+        """
+        players_data, role_rewards = await self._leaderboard.get_top_players(guild.id)
+        members = []
+        for player_data in players_data:
+            member = guild.get_member(int(player_data["id"]))
+            if member is None:
+                continue
+            members.append((player_data, member))
+            if len(members) == amount:
+                break
+
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_AVATAR_FETCHES)
+
+        async def get_avatar(member: discord.Member) -> Image.Image:
+            async with semaphore:
+                return await self._get_avatar(member)
+
+        avatars = await asyncio.gather(*(get_avatar(member) for _, member in members))
+        return [
+            PlayerWithAvatar(player_data, member, role_rewards, avatar)
+            for (player_data, member), avatar in zip(members, avatars)
+        ]
+
+    async def _get_avatar(self, member: discord.Member) -> Image.Image:
+        """
+        Gets member's avatar fitted and masked for the rank card.
+
+        Returned image is shared through the avatar cache and shouldn't be modified.
+        """
+        avatar_hash = member.avatar or f"default_{member.default_avatar.value}"
+        key: AvatarKey = (member.id, avatar_hash)
+        if (avatar := self._avatar_cache.get(key)) is not None:
+            return avatar
+
+        data = await member.avatar_url_as(
+            format="png", size=self.template.avatar_cdn_size
+        ).read()
+        avatar = await self._run_in_executor(self.template.prepare_avatar, data)
+        self._avatar_cache.set(key, avatar)
+        return avatar
 
     def _message_amount_from_xp(self, xp_needed: int) -> int:
         return math.ceil(xp_needed / self.AVG_XP_GAIN)
@@ -14,15 +14,30 @@
 
 from __future__ import annotations
 
-import math
-from functools import cached_property
-from io import BytesIO
+from bisect import bisect_right
 from typing import Any, Dict, List, Optional
 
 import discord
+from PIL import Image
+
+from .levels import total_xp_for_level
 
 
 class Player:
+    __slots__ = (
+        "_player_data",
+        "member",
+        "guild",
+        "role_rewards",
+        "_role_reward_ranks",
+        "level_xp",
+        "level_total_xp",
+        "total_xp",
+        "level",
+        "rank",
+        "message_count",
+    )
+
     def __init__(
         self,
         player_data: Dict[str, Any],
@@ -33,6 +48,10 @@ class Player:
         self.member = member
         self.guild = member.guild
         self.role_rewards = self._generate_role_rewards_list(role_rewards)
+        # sorted ranks of role rewards for bisecting
+        self._role_reward_ranks = [
+            role_reward.rank for role_reward in self.role_rewards
+        ]
 
         self.level_xp: int
         self.level_total_xp: int
@@ -55,40 +74,40 @@ class Player:
         ret.sort()
         return ret
 
-    @cached_property
+    @property
     def next_role_reward(self) -> Optional[RoleReward]:
-        for role_reward in self.role_rewards:
-            if role_reward.rank > self.level:
-                return role_reward
+        idx = bisect_right(self._role_reward_ranks, self.level)
+        if idx < len(self.role_rewards):
+            return self.role_rewards[idx]
         return None
 
-    @cached_property
+    @property
     def xp_until_next_level(self) -> int:
         return self.level_total_xp - self.level_xp
 
     def xp_until_level(self, level: int) -> int:
         if level <= self.level:
             raise ValueError("Player has already reached the passed `level`")
-        # formula taken from https://github.com/PsKramer/mee6calc/blob/master/calc.js
-        needed_total_xp = math.ceil(
-            5 / 6 * level * (2 * level * level + 27 * level + 91)
-        )
-        return needed_total_xp - self.total_xp
+        return total_xp_for_level(level) - self.total_xp
 
 
 class PlayerWithAvatar(Player):
+    __slots__ = ("avatar",)
+
     def __init__(
         self,
         player_data: Dict[str, Any],
         member: discord.Member,
         role_rewards: List[Dict[str, Any]],
-        avatar: BytesIO,
+        avatar: Image.Image,
     ) -> None:
         super().__init__(player_data, member, role_rewards)
         self.avatar = avatar
 
 
 class RoleReward:
+    __slots__ = ("rank", "role")
+
     def __init__(self, rank: int, role: discord.Role) -> None:
         self.rank = rank
         self.role = role
@@ -0,0 +1,165 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Literal, Optional, Sequence, Tuple
+
+from .encoders import ENCODERS, ImageEncoder, encode_image
+from .image import Mee6RankImageTemplate, PlayerCard
+
+__all__ = (
+    "RenderBackend",
+    "RENDER_BACKENDS",
+    "ImageRenderer",
+    "render_image",
+    "render_leaderboard_image",
+)
+
+log = logging.getLogger("red.jackcogs.mee6rank.rendering")
+
+RenderBackend = Literal["thread", "process"]
+RENDER_BACKENDS = ("thread", "process")
+# forking would copy the whole bot process (including its event loop and threads)
+# into the workers so they're always spawned instead
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# template loaded in the worker process
+_worker_template: Optional[Mee6RankImageTemplate] = None
+
+
+def render_image(
+    template: Mee6RankImageTemplate, player: PlayerCard, encoder_name: str
+) -> bytes:
+    """
+    Renders rank card for given player and returns it encoded with given encoder.
+
+    Encoder is passed by name so that it can be cheaply sent to worker processes.
+    """
+    result = template.generate_image(player)
+    return encode_image(result, ENCODERS[encoder_name])
+
+
+def render_leaderboard_image(
+    template: Mee6RankImageTemplate, players: Sequence[PlayerCard], encoder_name: str
+) -> bytes:
+    """
+    Renders rank cards of given players stacked on each other
+    and returns them encoded with given encoder.
+    """
+    result = template.generate_leaderboard_image(players)
+    return encode_image(result, ENCODERS[encoder_name])
+
+
+def _init_worker(template: Mee6RankImageTemplate) -> None:
+    # template is pickled when sent to the spawned worker,
+    # its assets are loaded during unpickling
+    global _worker_template
+    _worker_template = template
+
+
+def _get_worker_template() -> Mee6RankImageTemplate:
+    assert _worker_template is not None, "worker wasn't initialized"
+    return _worker_template
+
+
+def _render_in_worker(player: PlayerCard, encoder_name: str) -> bytes:
+    return render_image(_get_worker_template(), player, encoder_name)
+
+
+def _render_leaderboard_in_worker(
+    players: Tuple[PlayerCard, ...], encoder_name: str
+) -> bytes:
+    return render_leaderboard_image(_get_worker_template(), players, encoder_name)
+
+
+class ImageRenderer:
+    """
+    Renders rank cards using either a thread pool or a process pool.
+
+    Thread pool shares the template with the cog,
+    worker processes get their own copy of the template when they're started
+    and only receive plain player data (`PlayerCard`) for each render.
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, template: Mee6RankImageTemplate
+    ) -> None:
+        self.loop = loop
+        self.template = template
+        self.backend: RenderBackend = "thread"
+        self.pool_size: Optional[int] = None
+        self._executor: Executor = ThreadPoolExecutor()
+
+    def configure(self, backend: RenderBackend, pool_size: Optional[int]) -> None:
+        """Changes the rendering backend and/or its pool size."""
+        self.backend = backend
+        self.pool_size = pool_size
+        self._restart_executor()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def _restart_executor(self) -> None:
+        old_executor = self._executor
+        if self.backend == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=_MP_CONTEXT,
+                initializer=_init_worker,
+                initargs=(self.template,),
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        # already submitted renders will still finish
+        old_executor.shutdown(wait=False)
+
+    async def render(self, player: PlayerCard, encoder: ImageEncoder) -> bytes:
+        """Renders rank card for given player and returns it encoded."""
+        func: Callable[[], bytes]
+        if self.backend == "process":
+            func = functools.partial(_render_in_worker, player, encoder.name)
+        else:
+            func = functools.partial(render_image, self.template, player, encoder.name)
+        return await self._run(func)
+
+    async def render_leaderboard(
+        self, players: Tuple[PlayerCard, ...], encoder: ImageEncoder
+    ) -> bytes:
+        """
+        Renders rank cards of given players in a single executor job
+        and returns them encoded.
+        """
+        func: Callable[[], bytes]
+        if self.backend == "process":
+            func = functools.partial(
+                _render_leaderboard_in_worker, players, encoder.name
+            )
+        else:
+            func = functools.partial(
+                render_leaderboard_image, self.template, players, encoder.name
+            )
+        return await self._run(func)
+
+    async def _run(self, func: Callable[[], bytes]) -> bytes:
+        try:
+            return await self.loop.run_in_executor(self._executor, func)
+        except BrokenProcessPool:
+            log.error("Process pool used for rendering broke, restarting it.")
+            self._restart_executor()
+            return await self.loop.run_in_executor(self._executor, func)
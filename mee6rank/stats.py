@@ -0,0 +1,87 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+from typing import Any, Collection, Dict, List, Tuple
+
+__all__ = ("Bucket", "LeaderboardColumns")
+
+# (lower bound, upper bound (exclusive), count)
+Bucket = Tuple[int, int, int]
+
+
+class LeaderboardColumns:
+    """
+    Sorted columns with levels, total XP and message counts of the leaderboard.
+
+    Columns are sorted independently of each other so that all statistics
+    can be calculated with bisection instead of iterating over all players.
+    """
+
+    __slots__ = ("levels", "total_xp", "message_counts")
+
+    def __init__(self, players: Collection[Dict[str, Any]]) -> None:
+        self.levels = array("q", sorted(map(itemgetter("level"), players)))
+        self.total_xp = array("q", sorted(map(itemgetter("xp"), players)))
+        self.message_counts = array(
+            "q", sorted(map(itemgetter("message_count"), players))
+        )
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    @staticmethod
+    def count_between(column: "array[int]", low: int, high: int) -> int:
+        """Count values in given column that are in range ``[low, high)``."""
+        return bisect_left(column, high) - bisect_left(column, low)
+
+    @staticmethod
+    def percentile(column: "array[int]", percent: float) -> int:
+        """Get given percentile (nearest-rank) of the values in given column."""
+        if not column:
+            raise ValueError("Can't calculate percentile of an empty column.")
+        idx = max(0, math.ceil(percent / 100 * len(column)) - 1)
+        return column[idx]
+
+    def count_below_level(self, level: int) -> int:
+        return bisect_left(self.levels, level)
+
+    def level_histogram(self, max_buckets: int = 10) -> List[Bucket]:
+        """Get counts of levels in equal-sized buckets (with size divisible by 5)."""
+        if not self.levels:
+            return []
+        bucket_size = 5 * max(1, math.ceil((self.levels[-1] + 1) / (5 * max_buckets)))
+        return [
+            (
+                low,
+                low + bucket_size,
+                self.count_between(self.levels, low, low + bucket_size),
+            )
+            for low in range(0, self.levels[-1] + 1, bucket_size)
+        ]
+
+    def message_count_histogram(self) -> List[Bucket]:
+        """Get counts of message counts in buckets growing by the power of 10."""
+        if not self.message_counts:
+            return []
+        edges = [0, 1]
+        while edges[-1] <= self.message_counts[-1]:
+            edges.append(edges[-1] * 10)
+        return [
+            (low, high, self.count_between(self.message_counts, low, high))
+            for low, high in zip(edges, edges[1:])
+        ]
@@ -0,0 +1,105 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from typing import Dict, NamedTuple, Tuple
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from .utils import LRUDict
+
+__all__ = ("TextStamp", "TextCache")
+
+
+class TextStamp(NamedTuple):
+    # RGBA image with the glyphs in the fill colour and transparent background
+    image: Image.Image
+    # offset of the glyphs from the position passed to `ImageDraw.text()`
+    offset: Tuple[int, int]
+
+
+class TextCache:
+    """
+    Bounded cache of text metrics and text stamps for the fonts of a template.
+
+    Metrics are keyed by ``(font name, text)``, stamps (text pre-rendered
+    to RGBA image) are additionally keyed by the fill colour.
+    Cache is shared by all renders using the template and is thread-safe.
+    """
+
+    MAX_METRICS = 4096
+    MAX_STAMPS = 256
+
+    def __init__(self, fonts: Dict[str, ImageFont.FreeTypeFont]) -> None:
+        self.fonts = fonts
+        self._lock = threading.Lock()
+        self._metrics: LRUDict[Tuple[str, str], Tuple[int, int]] = LRUDict(
+            self.MAX_METRICS
+        )
+        self._stamps: LRUDict[Tuple[str, str, str], TextStamp] = LRUDict(
+            self.MAX_STAMPS
+        )
+
+    def getsize(self, font_name: str, text: str) -> Tuple[int, int]:
+        """Gets size of given text, as returned by `ImageFont.getsize()`."""
+        key = (font_name, text)
+        with self._lock:
+            size = self._metrics.get(key)
+        if size is None:
+            size = self.fonts[font_name].getsize(text)
+            with self._lock:
+                self._metrics[key] = size
+        return size
+
+    def get_stamp(self, font_name: str, text: str, fill: str) -> TextStamp:
+        """Gets text stamp for given text. Returned image shouldn't be modified."""
+        key = (font_name, text, fill)
+        with self._lock:
+            stamp = self._stamps.get(key)
+        if stamp is None:
+            font = self.fonts[font_name]
+            mask, offset = font.getmask2(text, "L")
+            # colour channels are already filled so that drawing only sets alpha
+            image = Image.new("RGBA", mask.size, ImageColor.getrgb(fill)[:3] + (0,))
+            ImageDraw.Draw(image).text(
+                xy=(-offset[0], -offset[1]), text=text, font=font, fill=fill
+            )
+            stamp = TextStamp(image, offset)
+            with self._lock:
+                self._stamps[key] = stamp
+        return stamp
+
+    def draw_stamp(
+        self,
+        result: Image.Image,
+        xy: Tuple[float, float],
+        font_name: str,
+        text: str,
+        fill: str,
+    ) -> None:
+        """
+        Composites text stamp onto given image.
+
+        This is the stamp equivalent of ``ImageDraw.text(xy, text, fill, font)``.
+        """
+        stamp = self.get_stamp(font_name, text, fill)
+        if not stamp.image.width:
+            return
+        # `ImageDraw.text()` truncates the position the same way
+        dest = (int(xy[0] + stamp.offset[0]), int(xy[1] + stamp.offset[1]))
+        result.alpha_composite(stamp.image, dest)
+
+    def prerender(self, font_name: str, text: str, fill: str) -> None:
+        """Renders text stamp ahead of time so that renders don't have to."""
+        self.get_stamp(font_name, text, fill)
@@ -13,12 +13,38 @@
 # limitations under the License.
 
 import json
-from typing import Any, Dict, Union
+import random
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Optional, TypeVar, Union
 
 import aiohttp
 
 _BASE = 1000
 
+KT = TypeVar("KT")
+VT = TypeVar("VT")
+
+
+class LRUDict(Generic[KT, VT]):
+    """Dict-like container that discards the least recently used items."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[KT, VT] = OrderedDict()
+
+    def get(self, key: KT) -> Optional[VT]:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def __setitem__(self, key: KT, value: VT) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
 
 def natural_size(value: Union[float, int]) -> str:
     if value < _BASE:
@@ -30,6 +56,35 @@ def natural_size(value: Union[float, int]) -> str:
     return f"{_BASE * value / unit:.2f}{suffix}"
 
 
+def backoff_delay(tries: int, *, base: float, max_delay: float) -> float:
+    """
+    Returns delay (in seconds) before next retry of failed Mee6 API request.
+
+    This is only used when Mee6 didn't tell us for how long to wait -
+    delay from `get_retry_after()` should be preferred for 429 responses.
+    The delay doubles with each try (up to ``max_delay``) and half of it is random.
+    """
+    delay = min(max_delay, base * 2 ** tries)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def get_retry_after(
+    resp: aiohttp.ClientResponse, data: Union[Dict[str, Any], str]
+) -> Optional[float]:
+    """
+    Returns delay (in seconds) requested by the server with 429 response,
+    or `None` if the server didn't send one.
+    """
+    value: Any = resp.headers.get(aiohttp.hdrs.RETRY_AFTER)
+    if value is None and isinstance(data, dict):
+        value = data.get("retry_after")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        # HTTP-date format (or garbage) isn't supported
+        return None
+
+
 async def json_or_text(resp: aiohttp.ClientResponse) -> Union[Dict[str, Any], str]:
     """
     Returns json dict, if response's content type is json,
@@ -26,6 +26,11 @@ except ModuleNotFoundError as e:
             "You need `pillow` pip package to run this cog."
             " Downloader *should* have handled this for you."
         )
+    if e.name == "cachetools":
+        raise CogLoadError(
+            "You need `cachetools` pip package to run this cog."
+            " Downloader *should* have handled this for you."
+        )
     if e.name == "rlapi":
         raise CogLoadError(
             "You need `rlapi` pip package to run this cog."
@@ -16,13 +16,17 @@ import asyncio
 from abc import ABC, ABCMeta, abstractmethod
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Callable, TypeVar
+from typing import Any, Callable, Literal, Optional, TypeVar
 
 import rlapi
 from discord.ext.commands import CogMeta
 from redbot.core.config import Config
 
+from .encoders import ImageEncoder
 from .image import RLStatsImageTemplate
+from .player_lookup import PlayerLookup
+from .rendering import ImageRenderer
+from .tier_breakdown import TierBreakdownStore
 
 T = TypeVar("T")
 
@@ -43,13 +47,35 @@ class MixinMeta(ABC):
         self.config: Config
 
         self.rlapi_client: rlapi.Client
+        self._player_lookup: PlayerLookup
+        self.tier_breakdown: TierBreakdownStore
         self.cog_data_path: Path
         self.bundled_data_path: Path
         self.competitive_template: RLStatsImageTemplate
         self.extramodes_template: RLStatsImageTemplate
+        self._renderer: ImageRenderer
+        self._image_encoder: ImageEncoder
 
     @abstractmethod
     async def _run_in_executor(
         self, func: Callable[..., T], *args: Any, **kwargs: Any
     ) -> T:
         raise NotImplementedError()
+
+    @abstractmethod
+    async def _update_tier_breakdown(self) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def _set_templates_scale(self, scale: float) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def _set_template_background(
+        self,
+        template_name: Literal["competitive", "extramodes"],
+        *,
+        bg_image: Optional[Path] = None,
+        bg_overlay: Optional[int] = None,
+    ) -> None:
+        raise NotImplementedError()
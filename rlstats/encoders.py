@@ -0,0 +1,135 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from io import BytesIO
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image, features
+
+from .image import RLStatsImageMixin
+
+__all__ = (
+    "ImageEncoder",
+    "ENCODERS",
+    "DEFAULT_ENCODER",
+    "get_encoder",
+    "encode_image",
+    "benchmark_encoders",
+)
+
+
+class ImageEncoder(NamedTuple):
+    name: str
+    description: str
+    format: str
+    extension: str
+    params: Dict[str, Any]
+    # whether the image should be quantized to an adaptive palette before saving
+    palette: bool = False
+    # feature that needs to be supported by Pillow for this encoder to work
+    feature: Optional[str] = None
+
+    @property
+    def available(self) -> bool:
+        return self.feature is None or bool(features.check(self.feature))
+
+
+ENCODERS: Dict[str, ImageEncoder] = {
+    encoder.name: encoder
+    for encoder in (
+        ImageEncoder("png", "PNG with default compression", "PNG", "png", {}),
+        ImageEncoder(
+            "png_fast",
+            "PNG with low compression - faster, but bigger files",
+            "PNG",
+            "png",
+            {"compress_level": 1},
+        ),
+        ImageEncoder(
+            "png_palette",
+            "PNG with 256-color adaptive palette - smaller files, lower quality",
+            "PNG",
+            "png",
+            {},
+            palette=True,
+        ),
+        ImageEncoder(
+            "webp",
+            "lossy WebP - smallest files",
+            "WEBP",
+            "webp",
+            {"quality": 90},
+            feature="webp",
+        ),
+        ImageEncoder(
+            "webp_lossless",
+            "lossless WebP",
+            "WEBP",
+            "webp",
+            {"lossless": True, "method": 0},
+            feature="webp",
+        ),
+    )
+}
+DEFAULT_ENCODER = ENCODERS["png"]
+
+
+def get_encoder(name: str) -> ImageEncoder:
+    """
+    Gets encoder with given name.
+
+    Falls back to the default encoder, if the encoder isn't available.
+    """
+    encoder = ENCODERS.get(name, DEFAULT_ENCODER)
+    if not encoder.available:
+        return DEFAULT_ENCODER
+    return encoder
+
+
+def encode_image(
+    im: Union[Image.Image, RLStatsImageMixin], encoder: ImageEncoder
+) -> bytes:
+    """Encodes given image using given encoder."""
+    image: Image.Image = getattr(im, "_result", im)
+    if encoder.palette:
+        image = _quantize(image)
+    fp = BytesIO()
+    image.save(fp, encoder.format, **encoder.params)
+    return fp.getvalue()
+
+
+def _quantize(image: Image.Image) -> Image.Image:
+    if image.mode == "RGBA" and image.getchannel("A").getextrema()[0] < 255:
+        # fast octree is the only method that keeps the alpha channel
+        return image.quantize(colors=256, method=Image.FASTOCTREE)
+    # image is fully opaque so alpha channel can be dropped
+    return image.convert("RGB").quantize(colors=256)
+
+
+def benchmark_encoders(image: Image.Image) -> List[Tuple[ImageEncoder, float, int]]:
+    """
+    Encodes given image with each of the available encoders.
+
+    Returns list of tuples with the encoder, encoding time (in seconds)
+    and the size of encoded image (in bytes).
+    """
+    results = []
+    for encoder in ENCODERS.values():
+        if not encoder.available:
+            continue
+        start = time.perf_counter()
+        data = encode_image(image, encoder)
+        results.append((encoder, time.perf_counter() - start, len(data)))
+    return results
@@ -14,14 +14,18 @@
 
 from __future__ import annotations
 
+import functools
+import itertools
 from abc import ABC
 from pathlib import Path
 from typing import Any, BinaryIO, Dict, NamedTuple, Optional, Sequence, Tuple, Union
 
-from PIL import Image, ImageDraw, ImageFont
-from rlapi import Player, Playlist, PlaylistKey
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from rlapi import Player, PlaylistKey
 
 from .figures import Point
+from .text import TextCache
+from .tier_breakdown import TierBreakdownStore
 
 
 class CoordsInfo(NamedTuple):
@@ -29,32 +33,403 @@ class CoordsInfo(NamedTuple):
     font_name: Optional[str] = None
 
 
+class FontInfo(NamedTuple):
+    path: str
+    size: int
+
+
+class SeasonRewardsStats(NamedTuple):
+    level: int
+    wins: int
+    can_advance: bool
+
+
+class PlaylistStats(NamedTuple):
+    key: PlaylistKey
+    rank_name: str
+    tier: int
+    tier_max: int
+    skill: int
+    matches_played: int
+    win_streak: int
+    estimated_tier: int
+    div_down: Optional[int]
+    div_up: Optional[int]
+    tier_down: Optional[int]
+    tier_up: Optional[int]
+
+
+class PlayerStats(NamedTuple):
+    """
+    Plain player data needed to render the stats image.
+
+    Unlike `rlapi.Player`, this is cheap to pickle and hashable,
+    so it can be sent to worker processes.
+    """
+
+    player_id: str
+    platform_name: str
+    user_name: str
+    season_rewards: SeasonRewardsStats
+    playlists: Tuple[PlaylistStats, ...]
+
+    @classmethod
+    def from_player(
+        cls,
+        player: Player,
+        playlist_keys: Sequence[PlaylistKey],
+        tier_breakdown: TierBreakdownStore,
+    ) -> PlayerStats:
+        playlists = []
+        for playlist_key in playlist_keys:
+            playlist = player.get_playlist(playlist_key)
+            # this assert *should* be safe
+            assert playlist is not None, "mypy"
+            estimates = tier_breakdown.get_tier_estimates(
+                playlist_key.value,
+                skill=playlist.skill,
+                tier=playlist.tier,
+                division=playlist.division,
+                tier_max=playlist.tier_max,
+            )
+            playlists.append(
+                PlaylistStats(
+                    key=playlist_key,
+                    rank_name=str(playlist),
+                    tier=playlist.tier,
+                    tier_max=playlist.tier_max,
+                    skill=playlist.skill,
+                    matches_played=playlist.matches_played,
+                    win_streak=playlist.win_streak,
+                    estimated_tier=estimates.tier,
+                    div_down=estimates.div_down,
+                    div_up=estimates.div_up,
+                    tier_down=estimates.tier_down,
+                    tier_up=estimates.tier_up,
+                )
+            )
+        rewards = player.season_rewards
+        return cls(
+            player_id=player.player_id,
+            platform_name=player.platform.name,
+            user_name=player.user_name,
+            season_rewards=SeasonRewardsStats(
+                rewards.level, rewards.wins, rewards.can_advance
+            ),
+            playlists=tuple(playlists),
+        )
+
+
+def _scale_size(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+
+def _scale_image(im: Image.Image, scale: float) -> Image.Image:
+    if scale == 1:
+        return im
+    return im.resize(_scale_size(im.size, scale), Image.LANCZOS)
+
+
+# template versions are unique across all templates and their scaled copies
+_template_versions = itertools.count(1)
+
+
+@functools.lru_cache(maxsize=1)
+def _decode_images(images_path: Path, scale: float) -> Dict[str, Image.Image]:
+    """
+    Decodes all images from given directory (recursively) to RGBA mode
+    and scales them by given scale factor.
+
+    The result is cached so that all templates share a single copy of the images.
+    Returned images are shared and should *never* be modified in place.
+    """
+    images = {}
+    for path in images_path.glob("**/*.png"):
+        with Image.open(path) as im:
+            images[str(path)] = _scale_image(im.convert("RGBA"), scale)
+    return images
+
+
 class RLStatsImageTemplate:
     def __init__(
         self,
         *,
+        name: str,
         rank_size: Tuple[int, int],
         tier_size: Tuple[int, int],
         offsets: Dict[PlaylistKey, Tuple[int, int]],
         coords: Dict[str, CoordsInfo],
-        fonts: Dict[str, ImageFont.ImageFont],
+        fonts: Dict[str, FontInfo],
         bg_image: Path,
         bg_overlay: int,
         rank_base: Path,
+        images_path: Path,
         images: Dict[str, str],
         season_rewards_colors: Dict[int, str],
+        scale: float = 1.0,
     ):
-        self.rank_size = rank_size
-        self.tier_size = tier_size
-        self.offsets = offsets
-        self.coords = coords
-        self.fonts = fonts
-        self.bg_image = bg_image
-        self.bg_overlay = bg_overlay
+        self.name = name
+        # unscaled values, as passed to the template
+        self._base_rank_size = rank_size
+        self._base_tier_size = tier_size
+        self._base_offsets = offsets
+        self._base_coords = coords
+        self.font_infos = fonts
+        self._bg_image = bg_image
+        self._bg_overlay = bg_overlay
         self.rank_base = rank_base
+        self.images_path = images_path
         self.images = images
         self.season_rewards_colors = season_rewards_colors
 
+        # changed whenever anything that affects the rendered image changes
+        self.version = next(_template_versions)
+
+        # values scaled by the template's scale factor
+        self.scale: float
+        self.rank_size: Tuple[int, int]
+        self.tier_size: Tuple[int, int]
+        self.offsets: Dict[PlaylistKey, Tuple[int, int]]
+        self.coords: Dict[str, CoordsInfo]
+        self.fonts: Dict[str, ImageFont.FreeTypeFont]
+        # text metrics and stamps for the scaled fonts
+        self.text: TextCache
+
+        # asset atlas - images decoded once and shared (read-only!) between renders
+        self._bg_image_data: Optional[Image.Image] = None
+        # (template version, static base image)
+        self._static_base: Optional[Tuple[int, Image.Image]] = None
+        self._rank_base_image: Image.Image
+        self._atlas: Dict[str, Image.Image]
+        self._rank_images: Dict[int, Image.Image]
+        self._tier_images: Dict[int, Image.Image]
+        self._grid_tier_images: Dict[int, Image.Image]
+        # row count -> (template version, grid base image)
+        self._grid_bases: Dict[int, Tuple[int, Image.Image]] = {}
+        self._set_scale(scale)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # decoded assets and fonts can't (or shouldn't) be pickled,
+        # they are loaded again when the template is unpickled
+        state = self.__dict__.copy()
+        for attr_name in (
+            "fonts",
+            "text",
+            "_bg_image_data",
+            "_static_base",
+            "_rank_base_image",
+            "_atlas",
+            "_rank_images",
+            "_tier_images",
+            "_grid_tier_images",
+            "_grid_bases",
+        ):
+            state.pop(attr_name, None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._static_base = None
+        self._grid_bases = {}
+        self._set_scale(self.scale)
+
+    @property
+    def bg_image(self) -> Path:
+        return self._bg_image
+
+    @property
+    def bg_overlay(self) -> int:
+        return self._bg_overlay
+
+    def scaled(self, value: float) -> int:
+        """Scales given value (in 1920x1080 space) by the template's scale factor."""
+        return round(value * self.scale)
+
+    def with_scale(self, scale: float) -> RLStatsImageTemplate:
+        """
+        Creates a copy of the template with given scale factor for the rendered images.
+
+        Scale of existing template is never changed as it could be used
+        by renders running in other threads. The copy should replace it instead.
+        """
+        state = self.__getstate__()
+        state["scale"] = scale
+        template = self.__class__.__new__(self.__class__)
+        template.__setstate__(state)
+        template.build_static_base()
+        return template
+
+    def with_background(
+        self, *, bg_image: Optional[Path] = None, bg_overlay: Optional[int] = None
+    ) -> RLStatsImageTemplate:
+        """
+        Creates a copy of the template with given background image and/or overlay.
+
+        Just like with `with_scale()`, the copy should replace existing template.
+        Decoded assets other than the background are shared with the copy.
+        """
+        template = self.__class__.__new__(self.__class__)
+        template.__dict__.update(self.__dict__)
+        template.version = next(_template_versions)
+        template._static_base = None
+        template._grid_bases = {}
+        if bg_image is not None:
+            template._bg_image = bg_image
+            # background is the only asset in the atlas that can change at runtime
+            template._bg_image_data = None
+        if bg_overlay is not None:
+            template._bg_overlay = bg_overlay
+        template.build_static_base()
+        return template
+
+    def _set_scale(self, scale: float) -> None:
+        """
+        Sets the scale factor for the rendered images.
+
+        This pre-scales coords, offsets and fonts, and reloads all assets
+        so that the image is rendered natively at the output size.
+        This should only be called on a template that isn't used yet.
+        """
+        self.scale = scale
+        self.version = next(_template_versions)
+        self.rank_size = _scale_size(self._base_rank_size, scale)
+        self.tier_size = _scale_size(self._base_tier_size, scale)
+        self.offsets = {
+            playlist_key: _scale_size(offset, scale)
+            for playlist_key, offset in self._base_offsets.items()
+        }
+        self.coords = {
+            coords_name: CoordsInfo(
+                Point(self.scaled(point.x), self.scaled(point.y)), font_name
+            )
+            for coords_name, (point, font_name) in self._base_coords.items()
+        }
+        self.fonts = {
+            font_name: ImageFont.truetype(path, max(1, self.scaled(size)))
+            for font_name, (path, size) in self.font_infos.items()
+        }
+        self.text = TextCache(self.fonts)
+        self._prerender_labels()
+        self._bg_image_data = None
+        self.load_assets()
+
+    def load_assets(self) -> None:
+        """Decodes all images used by the template and pre-scales them."""
+        self._atlas = _decode_images(self.images_path, self.scale)
+        with Image.open(self.rank_base) as im:
+            self._rank_base_image = _scale_image(im.convert("RGBA"), self.scale)
+        self._rank_images = {}
+        self._tier_images = {}
+        self._grid_tier_images = {}
+        grid_tier_size = _scale_size(RLStatsGridImage.TIER_SIZE, self.scale)
+        tier = 0
+        while (path := self.images["tier_image"].format(tier)) in self._atlas:
+            # thumbnails are made from the original image for better quality
+            with Image.open(path) as im:
+                tier_image = im.convert("RGBA")
+            rank_image = tier_image.copy()
+            rank_image.thumbnail(self.rank_size, Image.ANTIALIAS)
+            self._rank_images[tier] = rank_image
+            grid_tier_image = tier_image.copy()
+            grid_tier_image.thumbnail(grid_tier_size, Image.ANTIALIAS)
+            self._grid_tier_images[tier] = grid_tier_image
+            tier_image.thumbnail(self.tier_size, Image.ANTIALIAS)
+            self._tier_images[tier] = tier_image
+            tier += 1
+        self.get_bg_image()
+
+    def _prerender_labels(self) -> None:
+        # static labels are composited as stamps instead of being rasterized
+        # on every render, other labels get stamped once they're first used
+        labels = {
+            "playlist_name": [str(playlist_key) for playlist_key in self._base_offsets],
+            "win_streak_text": ["Win Streak:", "Losing Streak:"],
+            "gain": ["N/A"],
+            "div_down": ["N/A"],
+            "div_up": ["N/A"],
+            "tier_down": ["N/A"],
+            "tier_up": ["N/A"],
+        }
+        for coords_name, texts in labels.items():
+            font_name = self.coords[coords_name].font_name
+            assert isinstance(font_name, str), "mypy"  # all labels have font name
+            for text in texts:
+                self.text.prerender(font_name, text, "white")
+
+    def get_bg_image(self) -> Image.Image:
+        """Gets decoded background image. Returned image should not be modified."""
+        bg_image = self._bg_image_data
+        if bg_image is None:
+            with Image.open(self._bg_image) as im:
+                bg_image = _scale_image(im.convert("RGBA"), self.scale)
+            self._bg_image_data = bg_image
+        return bg_image
+
+    def get_static_base(self) -> Image.Image:
+        """
+        Gets static base of the stats image - background with overlay and rank base.
+
+        The image is cached for current template version.
+        Returned image should not be modified.
+        """
+        version = self.version
+        static_base = self._static_base
+        if static_base is None or static_base[0] != version:
+            static_base = self._static_base = (version, self._generate_static_base())
+        return static_base[1]
+
+    def build_static_base(self) -> None:
+        """(Re)builds the cached static base for current background and overlay."""
+        self.get_static_base()
+
+    def _generate_static_base(self) -> Image.Image:
+        result = self.get_bg_image().copy()
+        result.alpha_composite(
+            Image.new(
+                "RGBA",
+                result.size,
+                color=(0, 0, 0, int(self.bg_overlay * 255 / 100)),
+            )
+        )
+        result.alpha_composite(self._rank_base_image)
+        return result
+
+    def get_grid_base(self, rows: int) -> Image.Image:
+        """
+        Gets base of the grid image with given amount of rows - background
+        with overlay, row stripes and playlist names.
+
+        The image is cached for current template version.
+        Returned image should not be modified.
+        """
+        version = self.version
+        grid_base = self._grid_bases.get(rows)
+        if grid_base is None or grid_base[0] != version:
+            grid_base = self._grid_bases[rows] = (
+                version,
+                RLStatsGridImage.generate_base(self, rows),
+            )
+        return grid_base[1]
+
+    def get_image(self, image_name: str, *args: Any) -> Image.Image:
+        """
+        Gets decoded image with given name, formatted with given args.
+        Returned image should not be modified.
+        """
+        return self._atlas[self.images[image_name].format(*args)]
+
+    def get_rank_image(self, tier: int) -> Image.Image:
+        """Gets tier image scaled to rank size. Returned image shouldn't be modified."""
+        return self._rank_images[tier]
+
+    def get_tier_image(self, tier: int) -> Image.Image:
+        """Gets tier image scaled to tier size. Returned image shouldn't be modified."""
+        return self._tier_images[tier]
+
+    def get_grid_tier_image(self, tier: int) -> Image.Image:
+        """Gets tier image for the grid image. Returned image shouldn't be modified."""
+        return self._grid_tier_images[tier]
+
     def get_coords(
         self, coords_name: str, playlist_key: Optional[PlaylistKey] = None
     ) -> CoordsInfo:
@@ -67,9 +442,12 @@ class RLStatsImageTemplate:
         return CoordsInfo(coords_info.point + offset, coords_info.font_name)
 
     def generate_image(
-        self, player: Player, playlists: Tuple[PlaylistKey, ...]
+        self, player: PlayerStats, *, playlist_layers: bool = False
     ) -> RLStatsImage:
-        return RLStatsImage(self, player, playlists)
+        return RLStatsImage(self, player, playlist_layers=playlist_layers)
+
+    def generate_grid_image(self, players: Sequence[PlayerStats]) -> RLStatsGridImage:
+        return RLStatsGridImage(self, players)
 
 
 class MixinMeta(ABC):
@@ -131,13 +509,16 @@ class RLStatsImage(RLStatsImageMixin):
     def __init__(
         self,
         template: RLStatsImageTemplate,
-        player: Player,
-        playlists: Sequence[PlaylistKey],
+        player: PlayerStats,
+        *,
+        playlist_layers: bool = False,
     ) -> None:
         self.template = template
         self.player = player
-        self.playlists = playlists
-        self._result = Image.open(self.template.bg_image).convert("RGBA")
+        # draw every playlist on a separate full-size layer like older versions did,
+        # this is slower and is only kept for comparison in the rendering benchmark
+        self.playlist_layers = playlist_layers
+        self._result = self.template.get_static_base().copy()
         super().__init__()
         self._generate_image()
 
@@ -145,42 +526,33 @@ class RLStatsImage(RLStatsImageMixin):
         self._result.close()
 
     def _generate_image(self) -> None:
-        self._draw_bg_overlay()
-        self._draw_rank_base()
+        # background, its overlay and rank base are already part of the static base
         self._draw_username()
-        for playlist_key in self.playlists:
-            self.alpha_composite(RLStatsImagePlaylist(self, playlist_key))
+        for playlist in self.player.playlists:
+            if self.playlist_layers:
+                layer = Image.new("RGBA", self.size)
+                self.alpha_composite(RLStatsImagePlaylist(self, playlist, layer))
+            else:
+                # playlist is drawn directly on this image
+                RLStatsImagePlaylist(self, playlist)
         self._draw_season_rewards()
 
-    def _draw_bg_overlay(self) -> None:
-        self.alpha_composite(
-            Image.new(
-                "RGBA",
-                self.size,
-                color=(0, 0, 0, int(self.template.bg_overlay * 255 / 100)),
-            )
-        )
-
-    def _draw_rank_base(self) -> None:
-        with Image.open(self.template.rank_base) as im:
-            self.alpha_composite(im.convert("RGBA"))
-
     def _draw_username(self) -> None:
         username_coords, font_name = self.template.get_coords("username")
         assert isinstance(font_name, str), "mypy"  # username has font name defined
         font = self.template.fonts[font_name]
-        w, h = font.getsize(self.player.user_name)
+        w, h = self.template.text.getsize(font_name, self.player.user_name)
         coords = username_coords - (w / 2, h / 2)
         self._draw.text(xy=coords, text=self.player.user_name, font=font, fill="white")
         self._draw_platform(w)
 
     def _draw_platform(self, w: int) -> None:
         coords, font_name = self.template.get_coords("platform")
-        with Image.open(
-            self.template.images["platform_image"].format(self.player.platform.name)
-        ) as platform_image:
-            coords += (w // 2, -(platform_image.height // 2))
-            self.alpha_composite(platform_image.convert("RGBA"), coords.to_tuple())
+        platform_image = self.template.get_image(
+            "platform_image", self.player.platform_name
+        )
+        coords += (w // 2, -(platform_image.height // 2))
+        self.alpha_composite(platform_image, coords.to_tuple())
 
     def _draw_season_rewards(self) -> None:
         self._draw_season_reward_lvl()
@@ -191,83 +563,76 @@ class RLStatsImage(RLStatsImageMixin):
     def _draw_season_reward_lvl(self) -> None:
         rewards = self.player.season_rewards
         coords, _ = self.template.get_coords("season_rewards_lvl")
-        with Image.open(
-            self.template.images["season_rewards_lvl"].format(
-                rewards.level, rewards.can_advance
-            )
-        ) as reward_image:
-            self.alpha_composite(reward_image.convert("RGBA"), coords.to_tuple())
+        reward_image = self.template.get_image(
+            "season_rewards_lvl", rewards.level, rewards.can_advance
+        )
+        self.alpha_composite(reward_image, coords.to_tuple())
 
     def _draw_season_reward_bars(self) -> None:
         rewards = self.player.season_rewards
-        reward_bars_win_image = Image.open(
-            self.template.images["season_rewards_bars_win"].format(rewards.level)
-        ).convert("RGBA")
+        reward_bars_win_image = self.template.get_image(
+            "season_rewards_bars_win", rewards.level
+        )
         if rewards.can_advance:
-            reward_bars_nowin_image = Image.open(
-                self.template.images["season_rewards_bars_nowin"].format(rewards.level)
-            ).convert("RGBA")
+            reward_bars_nowin_image = self.template.get_image(
+                "season_rewards_bars_nowin", rewards.level
+            )
         else:
-            reward_bars_nowin_image = Image.open(
-                self.template.images["season_rewards_bars_red"]
-            ).convert("RGBA")
+            reward_bars_nowin_image = self.template.get_image("season_rewards_bars_red")
         coords, _ = self.template.get_coords("season_rewards_bars")
         for win in range(0, 10):
-            coords += (83, 0)
+            bar_coords = coords + (self.template.scaled(83 * (win + 1)), 0)
             if rewards.wins > win:
-                self.alpha_composite(reward_bars_win_image, coords.to_tuple())
+                self.alpha_composite(reward_bars_win_image, bar_coords.to_tuple())
             else:
-                self.alpha_composite(reward_bars_nowin_image, coords.to_tuple())
-        reward_bars_win_image.close()
-        reward_bars_nowin_image.close()
+                self.alpha_composite(reward_bars_nowin_image, bar_coords.to_tuple())
 
     def _draw_season_reward_wins(self) -> None:
         rewards = self.player.season_rewards
         coords, _ = self.template.get_coords("season_rewards_wins_text")
         if rewards.can_advance:
-            wins_text_image = Image.open(
-                self.template.images["season_rewards_wins_white"]
-            )
+            wins_text_image = self.template.get_image("season_rewards_wins_white")
             fill = self.template.season_rewards_colors[rewards.level]
         else:
-            wins_text_image = Image.open(
-                self.template.images["season_rewards_wins_red"]
-            )
+            wins_text_image = self.template.get_image("season_rewards_wins_red")
             fill = self.template.season_rewards_colors[-1]
-        with wins_text_image:
-            self.alpha_composite(wins_text_image, coords.to_tuple())
+        self.alpha_composite(wins_text_image, coords.to_tuple())
 
         coords, font_name = self.template.get_coords("season_rewards_wins_max")
         # season_rewards_wins_max has font name defined
         assert isinstance(font_name, str), "mypy"
-        font = self.template.fonts[font_name]
         # TODO: rlapi package should define max
-        w, h = font.getsize("10")
+        w, h = self.template.text.getsize(font_name, "10")
         coords -= (w, h / 2)
-        self._draw.text(xy=coords, text="10", font=font, fill=fill)
+        self.template.text.draw_stamp(self._result, coords, font_name, "10", fill)
 
         coords, font_name = self.template.get_coords("season_rewards_wins_amount")
         # season_rewards_wins_amount has font name defined
         assert isinstance(font_name, str), "mypy"
         font = self.template.fonts[font_name]
         text = str(rewards.wins)
-        w, h = font.getsize(text)
+        w, h = self.template.text.getsize(font_name, text)
         coords -= (w, h / 2)
         self._draw.text(xy=coords, text=text, font=font, fill=fill)
 
 
 class RLStatsImagePlaylist(RLStatsImageMixin):
-    def __init__(self, img: RLStatsImage, playlist_key: PlaylistKey) -> None:
+    def __init__(
+        self,
+        img: RLStatsImage,
+        playlist: PlaylistStats,
+        layer: Optional[Image.Image] = None,
+    ) -> None:
         self.template = img.template
         self.player = img.player
         self.fonts = self.template.fonts
-        self._result = Image.new("RGBA", img.size)
+        self.text = self.template.text
+        # each playlist only draws in its own quadrant (see template's offsets)
+        # so there's no need for a separate full-size layer
+        self._result = img._result if layer is None else layer
         super().__init__()
-        self.playlist_key = playlist_key
-        playlist = self.player.get_playlist(self.playlist_key)
-        # this assert *should* be safe
-        assert isinstance(playlist, Playlist), "mypy"
-        self.playlist: Playlist = playlist
+        self.playlist_key = playlist.key
+        self.playlist = playlist
         self._draw_playlist()
 
     def get_coords(self, coords_name: str) -> CoordsInfo:
@@ -286,29 +651,23 @@ class RLStatsImagePlaylist(RLStatsImageMixin):
     def _draw_playlist_name(self) -> None:
         coords, font_name = self.get_coords("playlist_name")
         assert isinstance(font_name, str), "mypy"  # playlist_name has font name defined
-        font = self.fonts[font_name]
         playlist_name = str(self.playlist_key)
-        w, h = font.getsize(playlist_name)
+        w, h = self.text.getsize(font_name, playlist_name)
         coords -= (w / 2, h / 2)
-        self._draw.text(xy=coords, text=playlist_name, font=font, fill="white")
+        self.text.draw_stamp(self._result, coords, font_name, playlist_name, "white")
 
     def _draw_rank_image(self) -> None:
-        with Image.open(
-            self.template.images["tier_image"].format(self.playlist.tier)
-        ) as im:
-            rank_image = im.convert("RGBA")
-            rank_image.thumbnail(self.template.rank_size, Image.ANTIALIAS)
-            coords, _ = self.get_coords("rank_image")
-            self.alpha_composite(rank_image, coords.to_tuple())
+        rank_image = self.template.get_rank_image(self.playlist.tier)
+        coords, _ = self.get_coords("rank_image")
+        self.alpha_composite(rank_image, coords.to_tuple())
 
     def _draw_rank_name(self) -> None:
         coords, font_name = self.get_coords("rank_text")
-        playlist_name = str(self.playlist)
+        playlist_name = self.playlist.rank_name
         assert isinstance(font_name, str), "mypy"  # rank_text has font name defined
-        font = self.fonts[font_name]
-        w, h = font.getsize(playlist_name)
+        w, h = self.text.getsize(font_name, playlist_name)
         coords -= (w / 2, h / 2)
-        self._draw.text(xy=coords, text=playlist_name, font=font, fill="white")
+        self.text.draw_stamp(self._result, coords, font_name, playlist_name, "white")
 
     def _draw_matches_played(self) -> None:
         coords, font_name = self.get_coords("matches_played")
@@ -330,12 +689,11 @@ class RLStatsImagePlaylist(RLStatsImageMixin):
         assert isinstance(text_font_name, str), "mypy"
         # win_streak_amount has font name defined
         assert isinstance(amount_font_name, str), "mypy"
-        text_font = self.fonts[text_font_name]
         amount_font = self.fonts[amount_font_name]
-        w, _ = text_font.getsize(text)
+        w, _ = self.text.getsize(text_font_name, text)
         amount_coords += (w, 0)
         # Draw - "Win Streak" or "Losing Streak"
-        self._draw.text(xy=text_coords, text=text, font=text_font, fill="white")
+        self.text.draw_stamp(self._result, text_coords, text_font_name, text, "white")
         # Draw - amount of won/lost games
         self._draw.text(
             xy=amount_coords,
@@ -358,45 +716,184 @@ class RLStatsImagePlaylist(RLStatsImageMixin):
 
         coords, font_name = self.get_coords("gain")
         assert isinstance(font_name, str), "mypy"  # gain has font name defined
-        font = self.fonts[font_name]
         if gain == 0:
-            text = "N/A"
+            self.text.draw_stamp(self._result, coords, font_name, "N/A", "white")
         else:
+            font = self.fonts[font_name]
             text = str(round(gain, 3))
-        self._draw.text(xy=coords, text=text, font=font, fill="white")
+            self._draw.text(xy=coords, text=text, font=font, fill="white")
 
     def _draw_estimates(self) -> None:
         # Icon
-        tier = self.playlist.tier_estimates.tier
+        tier = self.playlist.estimated_tier
         attrs = {
             "div_down": None,
             "div_up": None,
-            "tier_down": self.template.images["tier_image"].format(
-                tier - 1 if tier > 0 else 0
-            ),
-            "tier_up": self.template.images["tier_image"].format(
-                tier + 1 if 0 < tier < self.playlist.tier_max else 0
-            ),
+            "tier_down": tier - 1 if tier > 0 else 0,
+            "tier_up": tier + 1 if 0 < tier < self.playlist.tier_max else 0,
         }
-        for attr_name, tier_image_path in attrs.items():
+        for attr_name, estimate_tier in attrs.items():
             coords, font_name = self.get_coords(attr_name)
             # div_down, div_up, tier_down and tier_up have font name defined
             assert isinstance(font_name, str), "mypy"
-            font = self.fonts[font_name]
             # Points
-            points = getattr(self.playlist.tier_estimates, attr_name)
-            if points is None:
-                text = "N/A"
-            else:
-                text = f"{points:+d}"
+            points = getattr(self.playlist, attr_name)
             # tier_down/tier_up image
-            if tier_image_path is not None:
-                with Image.open(tier_image_path) as im:
-                    tier_image = im.convert("RGBA")
-                    tier_image.thumbnail(self.template.tier_size, Image.ANTIALIAS)
-                    self.alpha_composite(tier_image, coords.to_tuple())
-                text_coords = coords + (self.template.tier_size[0] + 11, -5)
+            if estimate_tier is not None:
+                tier_image = self.template.get_tier_image(estimate_tier)
+                self.alpha_composite(tier_image, coords.to_tuple())
+                text_coords = coords + (
+                    self.template.tier_size[0] + self.template.scaled(11),
+                    -self.template.scaled(5),
+                )
             else:
                 text_coords = coords
 
-            self._draw.text(xy=text_coords, text=text, font=font, fill="white")
+            if points is None:
+                self.text.draw_stamp(
+                    self._result, text_coords, font_name, "N/A", "white"
+                )
+            else:
+                font = self.fonts[font_name]
+                text = f"{points:+d}"
+                self._draw.text(xy=text_coords, text=text, font=font, fill="white")
+
+
+class RLStatsGridImage(RLStatsImageMixin):
+    """
+    Compact comparison of multiple players - one row per player,
+    one column per playlist.
+
+    Sizes below are for 1920px wide image and get scaled by template's scale.
+    """
+
+    WIDTH = 1920
+    HEADER_HEIGHT = 100
+    ROW_HEIGHT = 130
+    BOTTOM_PADDING = 20
+    NAME_COLUMN_WIDTH = 480
+    PLAYLIST_COLUMN_WIDTH = 360
+    CELL_PADDING = 20
+    TIER_SIZE = (90, 90)
+    HEADER_FONT = "RobotoBold45"
+    USERNAME_FONT = "RobotoBold45"
+    SKILL_FONT = "RobotoBold45"
+    RANK_FONT = "RobotoLight30"
+
+    def __init__(
+        self, template: RLStatsImageTemplate, players: Sequence[PlayerStats]
+    ) -> None:
+        self.template = template
+        self.players = players
+        self.fonts = template.fonts
+        self.text = template.text
+        self.scaled = template.scaled
+        self._result = template.get_grid_base(len(players)).copy()
+        super().__init__()
+        self._generate_image()
+
+    def __del__(self) -> None:
+        self._result.close()
+
+    @classmethod
+    def generate_base(cls, template: RLStatsImageTemplate, rows: int) -> Image.Image:
+        """Generates base of the grid image (used by the template)."""
+        scaled = template.scaled
+        height = cls.HEADER_HEIGHT + rows * cls.ROW_HEIGHT + cls.BOTTOM_PADDING
+        size = (scaled(cls.WIDTH), scaled(height))
+        result = ImageOps.fit(template.get_bg_image(), size, Image.LANCZOS)
+        overlay = Image.new(
+            "RGBA", size, color=(0, 0, 0, int(template.bg_overlay * 255 / 100))
+        )
+        draw = ImageDraw.Draw(overlay)
+        # stripes on every other row make the rows easier to follow
+        for row in range(0, rows, 2):
+            top = cls.HEADER_HEIGHT + row * cls.ROW_HEIGHT
+            draw.rectangle(
+                (0, scaled(top), size[0], scaled(top + cls.ROW_HEIGHT) - 1),
+                fill=(255, 255, 255, 24),
+            )
+        result.alpha_composite(overlay)
+        return result
+
+    def _generate_image(self) -> None:
+        # all players have the same playlists
+        self._draw_header([playlist.key for playlist in self.players[0].playlists])
+        for row, player in enumerate(self.players):
+            row_center = (
+                self.HEADER_HEIGHT + row * self.ROW_HEIGHT + self.ROW_HEIGHT / 2
+            )
+            self._draw_player_name(player, row_center)
+            column_x = self.NAME_COLUMN_WIDTH
+            for playlist in player.playlists:
+                self._draw_playlist_cell(playlist, column_x, row_center)
+                column_x += self.PLAYLIST_COLUMN_WIDTH
+
+    def _draw_header(self, playlist_keys: Sequence[PlaylistKey]) -> None:
+        column_x = self.NAME_COLUMN_WIDTH
+        for playlist_key in playlist_keys:
+            text = str(playlist_key)
+            w, h = self.text.getsize(self.HEADER_FONT, text)
+            xy = (
+                self.scaled(column_x + self.PLAYLIST_COLUMN_WIDTH / 2) - w / 2,
+                self.scaled(self.HEADER_HEIGHT / 2) - h / 2,
+            )
+            self.text.draw_stamp(self._result, xy, self.HEADER_FONT, text, "white")
+            column_x += self.PLAYLIST_COLUMN_WIDTH
+
+    def _draw_player_name(self, player: PlayerStats, row_center: float) -> None:
+        platform_image = self.template.get_image("platform_image", player.platform_name)
+        x = self.scaled(self.CELL_PADDING)
+        self.alpha_composite(
+            platform_image, (x, self.scaled(row_center) - platform_image.height // 2)
+        )
+
+        x += platform_image.width + self.scaled(self.CELL_PADDING)
+        max_width = self.scaled(self.NAME_COLUMN_WIDTH - self.CELL_PADDING) - x
+        text = self._fit_text(self.USERNAME_FONT, player.user_name, max_width)
+        _, h = self.text.getsize(self.USERNAME_FONT, text)
+        self._draw.text(
+            xy=(x, self.scaled(row_center) - h / 2),
+            text=text,
+            font=self.fonts[self.USERNAME_FONT],
+            fill="white",
+        )
+
+    def _draw_playlist_cell(
+        self, playlist: PlaylistStats, column_x: int, row_center: float
+    ) -> None:
+        tier_image = self.template.get_grid_tier_image(playlist.tier)
+        x = self.scaled(column_x + self.CELL_PADDING)
+        self.alpha_composite(
+            tier_image, (x, self.scaled(row_center) - tier_image.height // 2)
+        )
+
+        x = self.scaled(column_x + self.CELL_PADDING * 2 + self.TIER_SIZE[0])
+        max_width = self.scaled(column_x + self.PLAYLIST_COLUMN_WIDTH) - x
+        self._draw.text(
+            xy=(x, self.scaled(row_center - 60)),
+            text=str(playlist.skill),
+            font=self.fonts[self.SKILL_FONT],
+            fill="white",
+        )
+        # rank name (e.g. "Platinum III Div II") is too long for a single line
+        tier_name, _, division_name = playlist.rank_name.partition(" Div ")
+        lines = [tier_name]
+        if division_name:
+            lines.append(f"Div {division_name}")
+        for line, offset_y in zip(lines, (-4, 28)):
+            text = self._fit_text(self.RANK_FONT, line, max_width)
+            self.text.draw_stamp(
+                self._result,
+                (x, self.scaled(row_center + offset_y)),
+                self.RANK_FONT,
+                text,
+                "white",
+            )
+
+    def _fit_text(self, font_name: str, text: str, max_width: int) -> str:
+        if self.text.getsize(font_name, text)[0] <= max_width:
+            return text
+        while text and self.text.getsize(font_name, f"{text}\u2026")[0] > max_width:
+            text = text[:-1]
+        return f"{text.rstrip()}\u2026"
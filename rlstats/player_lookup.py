@@ -0,0 +1,102 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import Dict, Optional, Tuple
+
+import cachetools
+import rlapi
+
+__all__ = ("PlayerLookup",)
+
+_KeyType = Tuple[str, Optional[rlapi.Platform]]
+
+
+class PlayerLookup:
+    """
+    Caching layer in front of `rlapi.Client.get_player()`.
+
+    Found players are cached for ``ttl`` seconds,
+    not found players are cached for (usually shorter) ``not_found_ttl`` seconds.
+    Concurrent lookups for the same player are coalesced into a single API call.
+    """
+
+    MAX_SIZE = 1024
+
+    def __init__(self, client: rlapi.Client, *, ttl: int, not_found_ttl: int) -> None:
+        self.client = client
+        self._cache: cachetools.TTLCache[_KeyType, Tuple[rlapi.Player, ...]]
+        self._not_found_cache: cachetools.TTLCache[
+            _KeyType, bool
+        ] = cachetools.TTLCache(maxsize=self.MAX_SIZE, ttl=not_found_ttl)
+        self.set_ttl(ttl)
+        self._in_flight: Dict[_KeyType, "asyncio.Task[Tuple[rlapi.Player, ...]]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def ttl(self) -> int:
+        return self._cache.ttl
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def set_ttl(self, ttl: int) -> None:
+        """Sets TTL of found players. This clears the cache of found players."""
+        self._cache = cachetools.TTLCache(maxsize=self.MAX_SIZE, ttl=ttl)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._not_found_cache.clear()
+
+    async def get_player(
+        self, player_id: str, platform: Optional[rlapi.Platform] = None
+    ) -> Tuple[rlapi.Player, ...]:
+        """
+        Get player skills for player ID.
+
+        This follows the spec of `rlapi.Client.get_player()`.
+        """
+        key = (player_id, platform)
+        if (players := self._cache.get(key)) is not None:
+            self.hits += 1
+            return players
+        if key in self._not_found_cache:
+            self.hits += 1
+            raise rlapi.PlayerNotFound(
+                "Player with provided ID could not be found (cached response)."
+            )
+
+        if (task := self._in_flight.get(key)) is None:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch_player(key))
+            self._in_flight[key] = task
+        else:
+            self.coalesced += 1
+
+        # shielded so that cancelling one of the waiters doesn't affect the others
+        return await asyncio.shield(task)
+
+    async def _fetch_player(self, key: _KeyType) -> Tuple[rlapi.Player, ...]:
+        try:
+            players = await self.client.get_player(*key)
+        except rlapi.PlayerNotFound:
+            self._not_found_cache[key] = True
+            raise
+        else:
+            self._cache[key] = players
+            return players
+        finally:
+            del self._in_flight[key]
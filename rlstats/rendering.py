@@ -0,0 +1,348 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Literal, Optional, Sequence, Tuple
+
+import cachetools
+
+from .encoders import ENCODERS, ImageEncoder, encode_image
+from .image import PlayerStats, PlaylistStats, RLStatsImageTemplate, SeasonRewardsStats
+
+if sys.platform != "win32":
+    import resource
+
+__all__ = (
+    "RenderBackend",
+    "RENDER_BACKENDS",
+    "RenderCache",
+    "ImageRenderer",
+    "render_image",
+    "render_grid_image",
+    "benchmark_rendering",
+)
+
+log = logging.getLogger("red.jackcogs.rlstats.rendering")
+
+RenderBackend = Literal["thread", "process"]
+RENDER_BACKENDS = ("thread", "process")
+# forking would copy the whole bot process (including its event loop and threads)
+# into the workers so they're always spawned instead
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# templates loaded in the worker process, keyed by template name
+_worker_templates: Dict[str, RLStatsImageTemplate] = {}
+
+
+def render_image(
+    template: RLStatsImageTemplate, player: PlayerStats, encoder_name: str
+) -> bytes:
+    """
+    Renders stats image for given player and returns it encoded with given encoder.
+
+    Encoder is passed by name so that it can be cheaply sent to worker processes.
+    """
+    result = template.generate_image(player)
+    return encode_image(result, ENCODERS[encoder_name])
+
+
+def render_grid_image(
+    template: RLStatsImageTemplate, players: Sequence[PlayerStats], encoder_name: str
+) -> bytes:
+    """
+    Renders grid image comparing given players
+    and returns it encoded with given encoder.
+    """
+    result = template.generate_grid_image(players)
+    return encode_image(result, ENCODERS[encoder_name])
+
+
+def _init_worker(templates: Iterable[RLStatsImageTemplate]) -> None:
+    # templates are pickled when sent to the spawned worker,
+    # their assets are loaded during unpickling
+    for template in templates:
+        template.build_static_base()
+        _worker_templates[template.name] = template
+
+
+def _render_in_worker(
+    template_name: str, player: PlayerStats, encoder_name: str
+) -> bytes:
+    return render_image(_worker_templates[template_name], player, encoder_name)
+
+
+def _render_grid_in_worker(
+    template_name: str, players: Tuple[PlayerStats, ...], encoder_name: str
+) -> bytes:
+    return render_grid_image(_worker_templates[template_name], players, encoder_name)
+
+
+def _get_peak_rss() -> Optional[int]:
+    """Get peak RSS (in bytes) of the current process, if it's available."""
+    if sys.platform == "win32":
+        return None
+    if sys.platform.startswith("linux"):
+        # `ru_maxrss` is kept across exec so for a spawned process it also includes
+        # peak RSS of the bot's process, VmHWM only counts the process itself
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports the value in bytes, other systems in kilobytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _make_benchmark_player(template: RLStatsImageTemplate) -> PlayerStats:
+    playlists = tuple(
+        PlaylistStats(
+            key=playlist_key,
+            rank_name=f"Rank {tier}",
+            tier=tier,
+            tier_max=19,
+            skill=1000 + tier * 10,
+            matches_played=250,
+            win_streak=-3 if tier % 2 else 3,
+            estimated_tier=tier,
+            div_down=-10,
+            div_up=15,
+            tier_down=-40,
+            tier_up=70,
+        )
+        for tier, playlist_key in enumerate(template.offsets, 5)
+    )
+    return PlayerStats(
+        player_id="benchmark",
+        platform_name="steam",
+        user_name="Benchmark",
+        season_rewards=SeasonRewardsStats(level=4, wins=7, can_advance=True),
+        playlists=playlists,
+    )
+
+
+def _benchmark_in_worker(
+    template: RLStatsImageTemplate, playlist_layers: bool, renders: int
+) -> Tuple[float, Optional[int]]:
+    player = _make_benchmark_player(template)
+    template.build_static_base()
+    # memory freed by the first render is usually kept by the allocator
+    # so the peak needs to be measured from before it
+    baseline = _get_peak_rss()
+    # the first render also warms up the caches (text stamps, etc.)
+    template.generate_image(player, playlist_layers=playlist_layers)
+    start = time.perf_counter()
+    for _ in range(renders):
+        template.generate_image(player, playlist_layers=playlist_layers)
+    elapsed = (time.perf_counter() - start) / renders
+    peak = _get_peak_rss()
+    if baseline is None or peak is None:
+        return elapsed, None
+    return elapsed, peak - baseline
+
+
+def benchmark_rendering(
+    template: RLStatsImageTemplate, renders: int
+) -> Dict[str, Tuple[float, Optional[int]]]:
+    """
+    Compare drawing playlists directly on the stats image
+    with drawing them on separate full-size layers (as older versions did).
+
+    Every mode is measured in a fresh worker process.
+
+    Returns dict mapping mode name to ``(average render time in seconds,
+    peak RSS increase in bytes)`` tuple. RSS is `None` when it's not available.
+    """
+    results = {}
+    for mode_name, playlist_layers in (("layers", True), ("direct", False)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=_MP_CONTEXT) as executor:
+            results[mode_name] = executor.submit(
+                _benchmark_in_worker, template, playlist_layers, renders
+            ).result()
+    return results
+
+
+class RenderCache:
+    """
+    LRU cache with per-item TTL for rendered (encoded) stats images.
+
+    Size of the cache is bounded by the total amount of bytes of cached images.
+    """
+
+    def __init__(self, *, max_size: int, ttl: int) -> None:
+        self._cache: cachetools.TTLCache[
+            Tuple[object, ...], bytes
+        ] = cachetools.TTLCache(maxsize=max_size, ttl=ttl, getsizeof=len)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def max_size(self) -> int:
+        return self._cache.maxsize
+
+    @property
+    def current_size(self) -> int:
+        return self._cache.currsize
+
+    @staticmethod
+    def make_key(
+        template: RLStatsImageTemplate, player: PlayerStats, encoder: ImageEncoder
+    ) -> Tuple[object, ...]:
+        # `player` includes stats of all playlists and season rewards
+        return (template.name, template.version, encoder.name, player)
+
+    @staticmethod
+    def make_grid_key(
+        template: RLStatsImageTemplate,
+        players: Tuple[PlayerStats, ...],
+        encoder: ImageEncoder,
+    ) -> Tuple[object, ...]:
+        return ("grid", template.name, template.version, encoder.name, players)
+
+    def get(self, key: Tuple[object, ...]) -> Optional[bytes]:
+        data = self._cache.get(key)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def set(self, key: Tuple[object, ...], data: bytes) -> None:
+        if len(data) > self._cache.maxsize:
+            # the image wouldn't fit in the cache anyway
+            return
+        self._cache[key] = data
+
+
+class ImageRenderer:
+    """
+    Renders stats images using either a thread pool or a process pool.
+
+    Thread pool shares the templates with the cog,
+    worker processes get their own copies of the templates when they're started
+    and only receive plain player data (`PlayerStats`) for each render.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        templates: Iterable[RLStatsImageTemplate],
+        cache: RenderCache,
+    ) -> None:
+        self.loop = loop
+        self.templates = tuple(templates)
+        self.cache = cache
+        self.backend: RenderBackend = "thread"
+        self.pool_size: Optional[int] = None
+        self._executor: Executor = ThreadPoolExecutor()
+
+    def configure(self, backend: RenderBackend, pool_size: Optional[int]) -> None:
+        """Changes the rendering backend and/or its pool size."""
+        self.backend = backend
+        self.pool_size = pool_size
+        self._restart_executor()
+
+    def set_templates(self, templates: Iterable[RLStatsImageTemplate]) -> None:
+        """Replaces the templates used by the renderer."""
+        self.templates = tuple(templates)
+        # threads get the templates with each render, only worker processes need this
+        if self.backend == "process":
+            self._restart_executor()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def _restart_executor(self) -> None:
+        old_executor = self._executor
+        if self.backend == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=_MP_CONTEXT,
+                initializer=_init_worker,
+                initargs=(self.templates,),
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        # already submitted renders will still finish
+        old_executor.shutdown(wait=False)
+
+    async def render(
+        self,
+        template: RLStatsImageTemplate,
+        player: PlayerStats,
+        encoder: ImageEncoder,
+    ) -> bytes:
+        """
+        Renders stats image for given player and returns it encoded with given encoder.
+
+        If an identical image was rendered recently, it's returned from the cache
+        without touching the executor.
+        """
+        cache_key = self.cache.make_key(template, player, encoder)
+        if (data := self.cache.get(cache_key)) is not None:
+            return data
+
+        func: Callable[[], bytes]
+        if self.backend == "process":
+            func = functools.partial(
+                _render_in_worker, template.name, player, encoder.name
+            )
+        else:
+            func = functools.partial(render_image, template, player, encoder.name)
+        data = await self._run(func)
+        self.cache.set(cache_key, data)
+        return data
+
+    async def render_grid(
+        self,
+        template: RLStatsImageTemplate,
+        players: Tuple[PlayerStats, ...],
+        encoder: ImageEncoder,
+    ) -> bytes:
+        """
+        Renders grid image comparing given players in a single executor job
+        and returns it encoded with given encoder.
+        """
+        cache_key = self.cache.make_grid_key(template, players, encoder)
+        if (data := self.cache.get(cache_key)) is not None:
+            return data
+
+        func: Callable[[], bytes]
+        if self.backend == "process":
+            func = functools.partial(
+                _render_grid_in_worker, template.name, players, encoder.name
+            )
+        else:
+            func = functools.partial(render_grid_image, template, players, encoder.name)
+        data = await self._run(func)
+        self.cache.set(cache_key, data)
+        return data
+
+    async def _run(self, func: Callable[[], bytes]) -> bytes:
+        try:
+            return await self.loop.run_in_executor(self._executor, func)
+        except BrokenProcessPool:
+            log.error("Process pool used for rendering broke, restarting it.")
+            self._restart_executor()
+            return await self.loop.run_in_executor(self._executor, func)
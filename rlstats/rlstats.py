@@ -13,31 +13,48 @@
 # limitations under the License.
 
 import asyncio
-import contextlib
+import copy
 import functools
 import logging
+import random
+import time
 from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import Any, Callable, Dict, List, Literal, Mapping, Tuple, TypeVar, cast
+from pathlib import Path
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Tuple,
+    TypeVar,
+    cast,
+)
 
 import discord
 import rlapi
-from PIL import ImageFont
 from redbot.core import commands
 from redbot.core.bot import Red
 from redbot.core.commands import NoParseOptional as Optional
 from redbot.core.config import Config
 from redbot.core.data_manager import bundled_data_path, cog_data_path
-from redbot.core.utils.chat_formatting import bold, inline
+from redbot.core.utils.chat_formatting import bold, humanize_list, inline
 from redbot.core.utils.menus import start_adding_reactions
 from redbot.core.utils.predicates import ReactionPredicate
 from rlapi.ext.tier_breakdown.trackernetwork import get_tier_breakdown
 
 from . import errors
 from .abc import CogAndABCMeta
+from .encoders import DEFAULT_ENCODER, get_encoder
 from .figures import Point
-from .image import CoordsInfo, RLStatsImageTemplate
+from .image import CoordsInfo, FontInfo, PlayerStats, RLStatsImageTemplate
+from .player_lookup import PlayerLookup
+from .rendering import ImageRenderer, RenderCache
 from .settings import SettingsMixin
+from .tier_breakdown import TierBreakdownStore
 
 log = logging.getLogger("red.jackcogs.rlstats")
 
@@ -58,10 +75,33 @@ If the user connected their game profile with `[p]rlconnect`,
 you can also use their Discord tag to show their stats.
 """
 
+RLSTATSMANY_DOCS = f"""
+Compare Rocket League stats in competitive playlists of multiple players.
+
+Up to {{max_players}} players can be compared in a single image.
+If a player ID matches accounts on multiple platforms, the first one found is used.
+
+{SUPPORTED_PLATFORMS}
+If the user connected their game profile with `[p]rlconnect`,
+you can also use their Discord tag to show their stats.
+"""
+
 
 class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
     """Get your Rocket League stats with a single command!"""
 
+    COMPETITIVE_PLAYLISTS = (
+        rlapi.PlaylistKey.solo_duel,
+        rlapi.PlaylistKey.doubles,
+        rlapi.PlaylistKey.solo_standard,
+        rlapi.PlaylistKey.standard,
+    )
+    EXTRAMODES_PLAYLISTS = (
+        rlapi.PlaylistKey.hoops,
+        rlapi.PlaylistKey.rumble,
+        rlapi.PlaylistKey.dropshot,
+        rlapi.PlaylistKey.snow_day,
+    )
     RANK_SIZE = (179, 179)
     TIER_SIZE = (49, 49)
     OFFSETS = {
@@ -97,6 +137,22 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
         "season_rewards_wins_max": CoordsInfo(Point(1658, 954), "ArimoRegular56"),
         "season_rewards_wins_amount": CoordsInfo(Point(1575, 954), "ArimoRegular56"),
     }
+    # coords above are for 1920x1080 images, the image is scaled to the chosen width
+    DEFAULT_IMAGE_WIDTH = 960
+    # total size (in bytes) and TTL (in seconds) of the cache for rendered images
+    RENDER_CACHE_SIZE = 32 * 1024 * 1024
+    RENDER_CACHE_TTL = 300
+    # TTL (in seconds) of the cache for player lookups that didn't find any player
+    PLAYER_NOT_FOUND_TTL = 15
+    # total time (in seconds) for looking up all player IDs given to a command
+    PLAYER_LOOKUP_TIMEOUT = 20
+    # max amount of players that can be compared with `[p]rlstatsmany`
+    MAX_GRID_PLAYERS = 10
+    # how often (in seconds) the tier breakdown is refreshed in the background
+    TIER_BREAKDOWN_REFRESH_INTERVAL = 7 * 24 * 60 * 60
+    # min/max delay (in seconds) between retries when the refresh fails
+    TIER_BREAKDOWN_MIN_RETRY_DELAY = 60
+    TIER_BREAKDOWN_MAX_RETRY_DELAY = 6 * 60 * 60
     SEASON_REWARDS_COLORS = {
         -1: "#fc3f3f",
         0: "#c18659",
@@ -117,32 +173,57 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
             self, identifier=6672039729, force_registration=True
         )
         self.config.register_global(
-            tier_breakdown={}, competitive_overlay=40, extramodes_overlay=70
+            # tier breakdown in old format, only kept for conversion to the new one
+            tier_breakdown={},
+            # rows in format used by `TierBreakdownStore`
+            tier_breakdown_rows=[],
+            tier_breakdown_updated_at=0.0,
+            competitive_overlay=40,
+            extramodes_overlay=70,
+            image_width=self.DEFAULT_IMAGE_WIDTH,
+            render_backend="thread",
+            render_pool_size=None,
+            image_encoder=DEFAULT_ENCODER.name,
+            player_cache_ttl=60,
         )
         self.config.register_user(player_id=None, platform=None)
 
         self.rlapi_client: rlapi.Client  # assigned in initialize()
+        self._player_lookup: PlayerLookup  # assigned in initialize()
+        self.tier_breakdown = TierBreakdownStore()
+        self._tier_breakdown_task: Optional["asyncio.Task[None]"] = None
         self.bundled_data_path = bundled_data_path(self)
         self.cog_data_path = cog_data_path(self)
         self._prepare_templates()
+        # held while new templates are built so that changes don't overwrite each other
+        self._templates_lock = asyncio.Lock()
+        self._renderer = ImageRenderer(
+            self.loop,
+            (self.competitive_template, self.extramodes_template),
+            RenderCache(max_size=self.RENDER_CACHE_SIZE, ttl=self.RENDER_CACHE_TTL),
+        )
+        self._image_encoder = DEFAULT_ENCODER
 
     def _prepare_templates(self) -> None:
         self.fonts = {
-            "ArimoRegular56": ImageFont.truetype(
+            "ArimoRegular56": FontInfo(
                 str(self.bundled_data_path / "fonts/ArimoRegular.ttf"), 56
             ),
-            "RobotoCondensedBold90": ImageFont.truetype(
+            "RobotoCondensedBold90": FontInfo(
                 str(self.bundled_data_path / "fonts/RobotoCondensedBold.ttf"), 90
             ),
-            "RobotoRegular74": ImageFont.truetype(
+            "RobotoRegular74": FontInfo(
                 str(self.bundled_data_path / "fonts/RobotoRegular.ttf"), 74
             ),
-            "RobotoBold45": ImageFont.truetype(
+            "RobotoBold45": FontInfo(
                 str(self.bundled_data_path / "fonts/RobotoBold.ttf"), 45
             ),
-            "RobotoLight45": ImageFont.truetype(
+            "RobotoLight45": FontInfo(
                 str(self.bundled_data_path / "fonts/RobotoLight.ttf"), 45
             ),
+            "RobotoLight30": FontInfo(
+                str(self.bundled_data_path / "fonts/RobotoLight.ttf"), 30
+            ),
         }
         self.images = {
             "platform_image": str(self.bundled_data_path) + "/images/platforms/{}.png",
@@ -171,6 +252,7 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
         if not bg_image.is_file():
             bg_image = self.bundled_data_path / "bgs/competitive.png"
         self.competitive_template = RLStatsImageTemplate(
+            name="competitive",
             rank_size=self.RANK_SIZE,
             tier_size=self.TIER_SIZE,
             offsets=self.OFFSETS,
@@ -179,13 +261,16 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
             bg_image=bg_image,
             bg_overlay=40,
             rank_base=self.rank_base,
+            images_path=self.bundled_data_path / "images",
             images=self.images,
             season_rewards_colors=self.SEASON_REWARDS_COLORS,
+            scale=self.DEFAULT_IMAGE_WIDTH / 1920,
         )
         bg_image = self.cog_data_path / "bgs/extramodes.png"
         if not bg_image.is_file():
             bg_image = self.bundled_data_path / "bgs/extramodes.png"
         self.extramodes_template = RLStatsImageTemplate(
+            name="extramodes",
             rank_size=self.RANK_SIZE,
             tier_size=self.TIER_SIZE,
             offsets=self.OFFSETS,
@@ -194,24 +279,49 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
             bg_image=bg_image,
             bg_overlay=70,
             rank_base=self.rank_base,
+            images_path=self.bundled_data_path / "images",
             images=self.images,
             season_rewards_colors=self.SEASON_REWARDS_COLORS,
+            scale=self.DEFAULT_IMAGE_WIDTH / 1920,
         )
 
     async def initialize(self) -> None:
         self.rlapi_client = rlapi.Client(await self._get_token())
-        tier_breakdown = self._convert_numbers_in_breakdown(
-            await self.config.tier_breakdown()
+        self._player_lookup = PlayerLookup(
+            self.rlapi_client,
+            ttl=await self.config.player_cache_ttl(),
+            not_found_ttl=self.PLAYER_NOT_FOUND_TTL,
+        )
+        await self._load_tier_breakdown()
+        self._tier_breakdown_task = asyncio.create_task(
+            self._tier_breakdown_refresh_loop()
         )
-        if not tier_breakdown:
-            tier_breakdown = await get_tier_breakdown(self.rlapi_client)
-            await self.config.tier_breakdown.set(tier_breakdown)
-        self.rlapi_client.tier_breakdown = tier_breakdown
-        self.extramodes_template.bg_overlay = await self.config.extramodes_overlay()
-        self.competitive_template.bg_overlay = await self.config.competitive_overlay()
+        await self._set_template_background(
+            "extramodes", bg_overlay=await self.config.extramodes_overlay()
+        )
+        await self._set_template_background(
+            "competitive", bg_overlay=await self.config.competitive_overlay()
+        )
+        scale = await self.config.image_width() / 1920
+        if self.competitive_template.scale != scale:
+            await self._set_templates_scale(scale)
+        self._renderer.configure(
+            await self.config.render_backend(), await self.config.render_pool_size()
+        )
+        encoder_name = await self.config.image_encoder()
+        self._image_encoder = get_encoder(encoder_name)
+        if self._image_encoder.name != encoder_name:
+            log.warning(
+                "Image encoder %r is not available, using %r instead.",
+                encoder_name,
+                self._image_encoder.name,
+            )
 
     def cog_unload(self) -> None:
+        if self._tier_breakdown_task is not None:
+            self._tier_breakdown_task.cancel()
         self.rlapi_client.destroy()
+        self._renderer.shutdown()
 
     __del__ = cog_unload
 
@@ -239,23 +349,91 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
             self._executor, functools.partial(func, *args, **kwargs)
         )
 
-    def _convert_numbers_in_breakdown(
-        self, d: Dict[str, Any], curr_lvl: int = 0
-    ) -> Dict[int, Any]:
-        """Converts (recursively) dictionary's keys with numbers to integers"""
-        new = {}
-        func: Callable[[Any, int], Any]
-        if curr_lvl < 2:
-            func = self._convert_numbers_in_breakdown
+    async def _set_templates_scale(self, scale: float) -> None:
+        # scaled templates are built off to the side and swapped in one step
+        # so that renders that are already running aren't affected
+        async with self._templates_lock:
+            competitive_template, extramodes_template = [
+                await self._run_in_executor(template.with_scale, scale)
+                for template in (self.competitive_template, self.extramodes_template)
+            ]
+            self.competitive_template = competitive_template
+            self.extramodes_template = extramodes_template
+            self._renderer.set_templates((competitive_template, extramodes_template))
+
+    async def _set_template_background(
+        self,
+        template_name: Literal["competitive", "extramodes"],
+        *,
+        bg_image: Optional[Path] = None,
+        bg_overlay: Optional[int] = None,
+    ) -> None:
+        # just like with the scale, the template isn't changed in place
+        attr_name = f"{template_name}_template"
+        async with self._templates_lock:
+            template = await self._run_in_executor(
+                getattr(self, attr_name).with_background,
+                bg_image=bg_image,
+                bg_overlay=bg_overlay,
+            )
+            setattr(self, attr_name, template)
+            self._renderer.set_templates(
+                (self.competitive_template, self.extramodes_template)
+            )
+
+    async def _load_tier_breakdown(self) -> None:
+        if rows := await self.config.tier_breakdown_rows():
+            self.tier_breakdown.set_rows(rows)
+        elif old_tier_breakdown := await self.config.tier_breakdown():
+            # tier breakdown saved by older version of the cog, convert it only once
+            self.tier_breakdown.set_breakdown(old_tier_breakdown)
+            await self.config.tier_breakdown_rows.set(self.tier_breakdown.rows)
+            await self.config.tier_breakdown.clear()
         else:
-            # just return value on lvl 2 (should be list)
-            def func(v: T, _: int) -> T:
-                return v
+            try:
+                await self._update_tier_breakdown()
+            except Exception as e:
+                # the background task is going to retry
+                log.warning("Fetching tier breakdown failed.", exc_info=e)
+            return
+        self.rlapi_client.tier_breakdown = self.tier_breakdown.to_breakdown()
+
+    async def _update_tier_breakdown(self) -> None:
+        breakdown = await get_tier_breakdown(self.rlapi_client)
+        self.tier_breakdown.set_breakdown(breakdown)
+        # `rlapi.Player` objects still use client's breakdown for their own estimates
+        self.rlapi_client.tier_breakdown = breakdown
+        await self.config.tier_breakdown_rows.set(self.tier_breakdown.rows)
+        await self.config.tier_breakdown_updated_at.set(time.time())
+
+    async def _tier_breakdown_refresh_loop(self) -> None:
+        retry_delay = self.TIER_BREAKDOWN_MIN_RETRY_DELAY
+        while True:
+            updated_at = await self.config.tier_breakdown_updated_at()
+            delay = updated_at + self.TIER_BREAKDOWN_REFRESH_INTERVAL - time.time()
+            if delay > 0:
+                # breakdown could have been updated with a command in the meantime
+                # so we check the time again after sleeping
+                await asyncio.sleep(delay)
+                continue
 
-        for k, v in d.items():
-            v = func(v, curr_lvl + 1)
-            new[int(k)] = v
-        return new
+            try:
+                await self._update_tier_breakdown()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # jitter prevents retrying in lockstep with other bots
+                delay = random.uniform(0.5, 1.5) * retry_delay
+                log.warning(
+                    "Refreshing tier breakdown failed, retrying in %.0f seconds.",
+                    delay,
+                    exc_info=e,
+                )
+                await asyncio.sleep(delay)
+                retry_delay = min(retry_delay * 2, self.TIER_BREAKDOWN_MAX_RETRY_DELAY)
+            else:
+                log.info("Tier breakdown has been refreshed.")
+                retry_delay = self.TIER_BREAKDOWN_MIN_RETRY_DELAY
 
     async def _get_token(self, api_tokens: Optional[Mapping[str, str]] = None) -> str:
         if api_tokens is None:
@@ -294,22 +472,83 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
     async def _get_players(
         self, player_ids: List[Tuple[str, Optional[rlapi.Platform]]]
     ) -> Tuple[rlapi.Player, ...]:
+        # all candidates are looked up concurrently
+        tasks = [
+            asyncio.create_task(self._player_lookup.get_player(player_id, platform))
+            for player_id, platform in player_ids
+        ]
+        _, pending = await asyncio.wait(tasks, timeout=self.PLAYER_LOOKUP_TIMEOUT)
+        for task in pending:
+            task.cancel()
+
         players: List[rlapi.Player] = []
-        for player_id, platform in player_ids:
-            with contextlib.suppress(rlapi.PlayerNotFound):
-                players += await self.rlapi_client.get_player(player_id, platform)
+        lookup_errors: List[BaseException] = []
+        # iterating over `tasks` rather than over done tasks to keep the order
+        for task in tasks:
+            if task in pending:
+                continue
+            if (exc := task.exception()) is None:
+                players += task.result()
+            elif not isinstance(exc, rlapi.PlayerNotFound):
+                lookup_errors.append(exc)
+
         if not players:
+            if lookup_errors:
+                raise lookup_errors[0]
+            if pending:
+                raise asyncio.TimeoutError
             raise rlapi.PlayerNotFound
+        # other candidates were found so the errors are only logged
+        for exc in lookup_errors:
+            log.warning("Failed to look up one of the player IDs.", exc_info=exc)
         # using dict.fromkeys() to make duplicates go away
         return tuple(dict.fromkeys(players))
 
+    async def _get_players_batch(
+        self, player_ids_list: List[List[Tuple[str, Optional[rlapi.Platform]]]]
+    ) -> List[Optional[rlapi.Player]]:
+        # each item of the list is a list of candidates for a single player,
+        # first found candidate is used and `None` is used when none were found
+        results = await asyncio.gather(
+            *(self._get_players(player_ids) for player_ids in player_ids_list),
+            return_exceptions=True,
+        )
+        players: List[Optional[rlapi.Player]] = []
+        lookup_errors: List[BaseException] = []
+        timed_out = False
+        for result in results:
+            if isinstance(result, BaseException):
+                players.append(None)
+                if isinstance(result, asyncio.TimeoutError):
+                    timed_out = True
+                elif not isinstance(result, rlapi.PlayerNotFound):
+                    lookup_errors.append(result)
+            else:
+                players.append(result[0])
+
+        if not any(players):
+            if lookup_errors:
+                raise lookup_errors[0]
+            if timed_out:
+                raise asyncio.TimeoutError
+            raise rlapi.PlayerNotFound
+        # other players were found so the errors are only logged
+        for exc in lookup_errors:
+            log.warning("Failed to look up one of the players.", exc_info=exc)
+        return players
+
     async def _maybe_get_players(
         self,
         ctx: commands.Context,
         player_ids: List[Tuple[str, Optional[rlapi.Platform]]],
     ) -> Optional[Tuple[rlapi.Player, ...]]:
+        return await self._maybe_lookup(ctx, self._get_players(player_ids))
+
+    async def _maybe_lookup(
+        self, ctx: commands.Context, lookup: Awaitable[T]
+    ) -> Optional[T]:
         try:
-            players = await self._get_players(player_ids)
+            players = await lookup
         except rlapi.Unauthorized as e:
             log.error(str(e))
             if await self.bot.is_owner(ctx.author):
@@ -334,6 +573,10 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
         except rlapi.PlayerNotFound as e:
             log.debug(str(e))
             await ctx.send("The specified profile could not be found.")
+        except asyncio.TimeoutError:
+            await ctx.send(
+                "Rocket League API took too long to respond. Try again later."
+            )
         else:
             return players
 
@@ -373,19 +616,6 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
             return players[result]
         return players[0]
 
-    def _generate_image(
-        self,
-        template: RLStatsImageTemplate,
-        playlists: Tuple[rlapi.PlaylistKey, ...],
-        player: rlapi.Player,
-    ) -> BytesIO:
-        result = template.generate_image(player, playlists)
-        fp = BytesIO()
-        result.thumbnail((960, 540))
-        result.save(fp, "PNG")
-        fp.seek(0)
-        return fp
-
     # geninfo-ignore: missing-docstring
     @commands.bot_has_permissions(embed_links=True, attach_files=True)
     @commands.cooldown(rate=3, per=5, type=commands.BucketType.user)
@@ -393,13 +623,9 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
     async def rlstats(
         self, ctx: commands.Context, *, player_id: Optional[str] = None
     ) -> None:
-        playlists = (
-            rlapi.PlaylistKey.solo_duel,
-            rlapi.PlaylistKey.doubles,
-            rlapi.PlaylistKey.solo_standard,
-            rlapi.PlaylistKey.standard,
+        await self._rlstats_logic(
+            ctx, self.competitive_template, self.COMPETITIVE_PLAYLISTS, player_id
         )
-        await self._rlstats_logic(ctx, self.competitive_template, playlists, player_id)
 
     rlstats.callback.__doc__ = RLSTATS_DOCS.format(mode="competitive")
 
@@ -410,13 +636,9 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
     async def rlsports(
         self, ctx: commands.Context, *, player_id: Optional[str] = None
     ) -> None:
-        playlists = (
-            rlapi.PlaylistKey.hoops,
-            rlapi.PlaylistKey.rumble,
-            rlapi.PlaylistKey.dropshot,
-            rlapi.PlaylistKey.snow_day,
+        await self._rlstats_logic(
+            ctx, self.extramodes_template, self.EXTRAMODES_PLAYLISTS, player_id
         )
-        await self._rlstats_logic(ctx, self.extramodes_template, playlists, player_id)
 
     rlsports.callback.__doc__ = RLSTATS_DOCS.format(mode="extra modes")
 
@@ -448,20 +670,9 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
                     )
                     return
             else:
-                try:
-                    discord_user = await commands.MemberConverter().convert(
-                        ctx, player_id
-                    )
-                except commands.BadArgument:
-                    pass
-                else:
-                    try:
-                        player_ids.append(
-                            await self._get_player_data_by_user(discord_user)
-                        )
-                    except errors.PlayerDataNotFound:
-                        discord_user = None
-                player_ids.append((player_id, None))
+                player_ids, discord_user = await self._get_player_id_candidates(
+                    ctx, player_id
+                )
 
             players = await self._maybe_get_players(ctx, player_ids)
             if players is None:
@@ -476,17 +687,9 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
                 )
                 return
 
-            # TODO: This should probably be handled in rlapi module
-            # be careful when touching this part,
-            # we rely on `player.get_playlist` not returning None in .image
-            for playlist_key in playlists:
-                if playlist_key not in player.playlists:
-                    player.add_playlist({"playlist": playlist_key.value})
-
-            # be extra careful when changing this (mypy won't type check this)
-            fp = await self._run_in_executor(
-                self._generate_image, template, playlists, player
-            )
+            player_stats = self._get_player_stats(player, playlists)
+            encoder = self._image_encoder
+            image_data = await self._renderer.render(template, player_stats, encoder)
         if discord_user is not None and player.player_id == player_ids[0][0]:
             account_string = (
                 f"connected {str(player.platform)} account of {bold(str(discord_user))}"
@@ -498,9 +701,103 @@ class RLStats(SettingsMixin, commands.Cog, metaclass=CogAndABCMeta):
                 f"Rocket League Stats for {account_string}\n"
                 "*(arrows show amount of points for division down/up)*"
             ),
-            file=discord.File(fp, f"{player.player_id}_profile.png"),
+            file=discord.File(
+                BytesIO(image_data), f"{player.player_id}_profile.{encoder.extension}"
+            ),
+        )
+
+    # geninfo-ignore: missing-docstring
+    @commands.bot_has_permissions(attach_files=True)
+    @commands.cooldown(rate=1, per=15, type=commands.BucketType.user)
+    @commands.command()
+    async def rlstatsmany(self, ctx: commands.Context, *player_ids: str) -> None:
+        if not player_ids:
+            await ctx.send_help()
+            return
+        if len(player_ids) > self.MAX_GRID_PLAYERS:
+            await ctx.send(
+                f"You can compare up to {self.MAX_GRID_PLAYERS} players at once."
+            )
+            return
+
+        async with ctx.typing():
+            if not await self._check_token(ctx):
+                return
+
+            player_ids_list = [
+                (await self._get_player_id_candidates(ctx, player_id))[0]
+                for player_id in player_ids
+            ]
+            results = await self._maybe_lookup(
+                ctx, self._get_players_batch(player_ids_list)
+            )
+            if results is None:
+                return
+
+            not_found = [
+                player_id
+                for player_id, player in zip(player_ids, results)
+                if player is None
+            ]
+            # using dict.fromkeys() to make duplicates go away
+            players = dict.fromkeys(player for player in results if player is not None)
+            players_stats = tuple(
+                self._get_player_stats(player, self.COMPETITIVE_PLAYLISTS)
+                for player in players
+            )
+            encoder = self._image_encoder
+            image_data = await self._renderer.render_grid(
+                self.competitive_template, players_stats, encoder
+            )
+
+        message = "Rocket League Stats comparison"
+        if not_found:
+            message += "\nCouldn't find these profiles: " + humanize_list(
+                [inline(player_id) for player_id in not_found]
+            )
+        await ctx.send(
+            message,
+            file=discord.File(
+                BytesIO(image_data), f"rlstats_comparison.{encoder.extension}"
+            ),
         )
 
+    rlstatsmany.callback.__doc__ = RLSTATSMANY_DOCS.format(max_players=MAX_GRID_PLAYERS)
+
+    async def _get_player_id_candidates(
+        self, ctx: commands.Context, player_id: str
+    ) -> Tuple[List[Tuple[str, Optional[rlapi.Platform]]], Optional[discord.Member]]:
+        player_ids: List[Tuple[str, Optional[rlapi.Platform]]] = []
+        discord_user: Optional[discord.Member]
+        try:
+            discord_user = await commands.MemberConverter().convert(ctx, player_id)
+        except commands.BadArgument:
+            discord_user = None
+        else:
+            try:
+                player_ids.append(await self._get_player_data_by_user(discord_user))
+            except errors.PlayerDataNotFound:
+                discord_user = None
+        player_ids.append((player_id, None))
+        return player_ids, discord_user
+
+    def _get_player_stats(
+        self, player: rlapi.Player, playlists: Tuple[rlapi.PlaylistKey, ...]
+    ) -> PlayerStats:
+        # TODO: This should probably be handled in rlapi module
+        # be careful when touching this part,
+        # we rely on `player.get_playlist` not returning None in .image
+        if any(playlist_key not in player.playlists for playlist_key in playlists):
+            # player objects are shared through the player cache,
+            # the missing playlists are only added to a copy
+            player = copy.copy(player)
+            player.playlists = dict(player.playlists)
+            for playlist_key in playlists:
+                if playlist_key not in player.playlists:
+                    player.add_playlist({"playlist": playlist_key.value})
+
+        return PlayerStats.from_player(player, playlists, self.tier_breakdown)
+
     @commands.command()
     async def rlconnect(self, ctx: commands.Context, *, player_id: str) -> None:
         """Connect game profile with your Discord account."""
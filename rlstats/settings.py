@@ -14,17 +14,17 @@
 
 from io import BytesIO
 from pathlib import Path
-from typing import cast
+from typing import Literal, cast
 
 from PIL import Image, ImageFile
 from redbot.core import commands
 from redbot.core.commands import NoParseOptional as Optional
 from redbot.core.config import Value
-from redbot.core.utils.chat_formatting import inline
-from rlapi.ext.tier_breakdown.trackernetwork import get_tier_breakdown
+from redbot.core.utils.chat_formatting import box, inline
 
 from .abc import MixinMeta
-from .image import RLStatsImageTemplate
+from .encoders import ENCODERS, benchmark_encoders
+from .rendering import RENDER_BACKENDS, RenderBackend, benchmark_rendering
 
 
 class SettingsMixin(MixinMeta):
@@ -56,11 +56,240 @@ class SettingsMixin(MixinMeta):
         """Update tier breakdown."""
         await ctx.send("Updating tier breakdown...")
         async with ctx.typing():
-            tier_breakdown = await get_tier_breakdown(self.rlapi_client)
-            await self.config.tier_breakdown.set(tier_breakdown)
-            self.rlapi_client.tier_breakdown = tier_breakdown
+            await self._update_tier_breakdown()
         await ctx.send("Tier breakdown updated.")
 
+    @rlset.command(name="resolution")
+    async def rlset_resolution(
+        self, ctx: commands.Context, width: Optional[int] = None
+    ) -> None:
+        """
+        Set the width of stats images. Height is calculated to keep 16:9 ratio.
+
+        Images are rendered directly at the chosen resolution.
+        Width needs to be in range 480-1920.
+        Leave empty to reset to default (960px).
+        """
+        if width is None:
+            await self.config.image_width.clear()
+            width = await self.config.image_width()
+        elif not 480 <= width <= 1920:
+            await ctx.send("Width has to be in range 480-1920.")
+            return
+        else:
+            await self.config.image_width.set(width)
+
+        scale = width / 1920
+        async with ctx.typing():
+            await self._set_templates_scale(scale)
+        await ctx.send(
+            f"Stats images will now be rendered in {width}x{round(1080 * scale)} size."
+        )
+
+    @rlset.command(name="stats")
+    async def rlset_stats(self, ctx: commands.Context) -> None:
+        """Show statistics of RLStats caches."""
+        cache = self._renderer.cache
+        lookups = cache.hits + cache.misses
+        hit_ratio = cache.hits / lookups if lookups else 0
+        message = (
+            "**Rendered images cache**\n"
+            f"Hits: {cache.hits}\n"
+            f"Misses: {cache.misses}\n"
+            f"Hit ratio: {hit_ratio:.1%}\n"
+            f"Cached images: {len(cache)}\n"
+            f"Size: {cache.current_size / 1024 ** 2:.2f}"
+            f"/{cache.max_size / 1024 ** 2:.2f} MiB\n\n"
+        )
+        player_lookup = self._player_lookup
+        lookups = player_lookup.hits + player_lookup.misses
+        hit_ratio = player_lookup.hits / lookups if lookups else 0
+        message += (
+            "**Player lookup cache**\n"
+            f"Hits: {player_lookup.hits}\n"
+            f"Misses: {player_lookup.misses}\n"
+            f"Hit ratio: {hit_ratio:.1%}\n"
+            f"Coalesced lookups: {player_lookup.coalesced}\n"
+            f"Cached lookups: {len(player_lookup)}"
+        )
+        await ctx.send(message)
+
+    @rlset.command(name="playercache")
+    async def rlset_playercache(
+        self, ctx: commands.Context, ttl: Optional[int] = None
+    ) -> None:
+        """
+        Set for how many seconds the player lookups should be cached.
+
+        Use 0 to disable caching.
+        Leave empty to reset to default (60 seconds).
+        """
+        if ttl is None:
+            await self.config.player_cache_ttl.clear()
+            ttl = await self.config.player_cache_ttl()
+        elif not 0 <= ttl <= 3600:
+            await ctx.send("TTL has to be in range 0-3600 seconds.")
+            return
+        else:
+            await self.config.player_cache_ttl.set(ttl)
+
+        self._player_lookup.set_ttl(ttl)
+        await ctx.send(f"Player lookups will now be cached for {ttl} seconds.")
+
+    @rlset.group(name="renderer")
+    async def rlset_renderer(self, ctx: commands.Context) -> None:
+        """Settings for rendering of stats images."""
+
+    @rlset_renderer.command(name="backend")
+    async def rlset_renderer_backend(
+        self, ctx: commands.Context, backend: Optional[str] = None
+    ) -> None:
+        """
+        Set whether stats images should be rendered in threads or processes.
+
+        Process backend renders images in separate worker processes,
+        which keeps the bot responsive when many images are rendered at once,
+        at the cost of higher memory usage.
+
+        Accepted values are `thread` and `process`.
+        Leave empty to reset to default (`thread`).
+        """
+        if backend is None:
+            await self.config.render_backend.clear()
+            backend = await self.config.render_backend()
+        else:
+            backend = backend.lower()
+            if backend not in RENDER_BACKENDS:
+                await ctx.send("Backend has to be either `thread` or `process`.")
+                return
+            await self.config.render_backend.set(backend)
+
+        self._renderer.configure(
+            cast(RenderBackend, backend), await self.config.render_pool_size()
+        )
+        await ctx.send(f"Stats images will now be rendered using {backend} backend.")
+
+    @rlset_renderer.command(name="poolsize")
+    async def rlset_renderer_poolsize(
+        self, ctx: commands.Context, pool_size: Optional[int] = None
+    ) -> None:
+        """
+        Set the amount of threads/processes used for rendering stats images.
+
+        Pool size needs to be in range 1-32.
+        Leave empty to reset to default (depends on the amount of CPUs).
+        """
+        if pool_size is None:
+            await self.config.render_pool_size.clear()
+        elif not 1 <= pool_size <= 32:
+            await ctx.send("Pool size has to be in range 1-32.")
+            return
+        else:
+            await self.config.render_pool_size.set(pool_size)
+
+        self._renderer.configure(self._renderer.backend, pool_size)
+        if pool_size is None:
+            await ctx.send("Pool size for rendering stats images reset to default.")
+        else:
+            await ctx.send(f"Pool size for rendering stats images set to {pool_size}.")
+
+    @rlset_renderer.command(name="encoder")
+    async def rlset_renderer_encoder(
+        self, ctx: commands.Context, encoder_name: Optional[str] = None
+    ) -> None:
+        """
+        Set the format in which stats images are encoded and uploaded.
+
+        Use `[p]rlset renderer benchmark` to compare encoding time
+        and file size of the available encoders.
+
+        Leave empty to list the available encoders.
+        """
+        if encoder_name is None:
+            lines = [
+                f"`{encoder.name}` - {encoder.description}"
+                for encoder in ENCODERS.values()
+                if encoder.available
+            ]
+            await ctx.send(
+                f"Current encoder: `{self._image_encoder.name}`\n\n"
+                "Available encoders:\n" + "\n".join(lines)
+            )
+            return
+
+        encoder = ENCODERS.get(encoder_name.lower())
+        if encoder is None or not encoder.available:
+            await ctx.send(
+                "There's no encoder with this name available,"
+                f" use `{ctx.clean_prefix}rlset renderer encoder` to list them."
+            )
+            return
+
+        await self.config.image_encoder.set(encoder.name)
+        self._image_encoder = encoder
+        await ctx.send(f"Stats images will now be encoded using `{encoder.name}`.")
+
+    @rlset_renderer.command(name="benchmark")
+    async def rlset_renderer_benchmark(self, ctx: commands.Context) -> None:
+        """
+        Compare encoding time and file size of the available encoders.
+
+        The benchmark uses backgrounds of the stats images at current resolution.
+        """
+        message = ""
+        async with ctx.typing():
+            for template in (self.competitive_template, self.extramodes_template):
+                results = await self._run_in_executor(
+                    benchmark_encoders, template.get_static_base()
+                )
+                lines = [
+                    f"{encoder.name:<14}{elapsed * 1000:>8.1f} ms"
+                    f"{size / 1024:>10.1f} KiB"
+                    for encoder, elapsed, size in results
+                ]
+                message += (
+                    f"**{template.name.capitalize()} background**\n"
+                    + box("\n".join(lines))
+                    + "\n"
+                )
+        await ctx.send(message)
+
+    @rlset_renderer.command(name="renderbenchmark")
+    async def rlset_renderer_renderbenchmark(
+        self, ctx: commands.Context, renders: int = 20
+    ) -> None:
+        """
+        Compare render time and peak memory usage of the rendering modes.
+
+        `layers` mode draws every playlist on a separate full-size layer
+        (like older versions of the cog did), `direct` mode is the one that's used.
+        Each mode is measured in a separate process, using the current resolution.
+        """
+        if not 1 <= renders <= 100:
+            await ctx.send("Amount of renders has to be in range 1-100.")
+            return
+        message = ""
+        async with ctx.typing():
+            for template in (self.competitive_template, self.extramodes_template):
+                results = await self._run_in_executor(
+                    benchmark_rendering, template, renders
+                )
+                lines = [
+                    f"{mode_name:<10}{elapsed * 1000:>8.1f} ms"
+                    + (
+                        f"{peak_rss / 1024 ** 2:>10.1f} MiB"
+                        if peak_rss is not None
+                        else f"{'N/A':>14}"
+                    )
+                    for mode_name, (elapsed, peak_rss) in results.items()
+                ]
+                message += (
+                    f"**{template.name.capitalize()} stats image**\n"
+                    + box("\n".join(lines))
+                    + "\n"
+                )
+        await ctx.send(message)
+
     @rlset.group(name="image")
     async def rlset_bgimage(self, ctx: commands.Context) -> None:
         """Set background for stats image."""
@@ -78,7 +307,7 @@ class SettingsMixin(MixinMeta):
         Use `[p]rlset bgimage extramodes reset` to reset to default.
         """
         await self._rlset_bgimage_set(
-            ctx, self.cog_data_path / "bgs/extramodes.png", self.extramodes_template
+            ctx, self.cog_data_path / "bgs/extramodes.png", "extramodes"
         )
 
     @rlset_bgimage_extramodes.command("reset")
@@ -89,7 +318,7 @@ class SettingsMixin(MixinMeta):
             "extra modes",
             self.cog_data_path / "bgs/extramodes.png",
             self.bundled_data_path / "bgs/extramodes.png",
-            self.extramodes_template,
+            "extramodes",
         )
 
     @rlset_bgimage_extramodes.command("overlay")
@@ -106,7 +335,7 @@ class SettingsMixin(MixinMeta):
             percentage,
             "extra modes",
             self.config.extramodes_overlay,
-            self.extramodes_template,
+            "extramodes",
         )
 
     @rlset_bgimage.group(name="competitive")
@@ -122,7 +351,7 @@ class SettingsMixin(MixinMeta):
         Use `[p]rlset bgimage competitive reset` to reset to default.
         """
         await self._rlset_bgimage_set(
-            ctx, self.cog_data_path / "bgs/competitive.png", self.competitive_template
+            ctx, self.cog_data_path / "bgs/competitive.png", "competitive"
         )
 
     @rlset_bgimage_competitive.command("reset")
@@ -133,7 +362,7 @@ class SettingsMixin(MixinMeta):
             "competitive",
             self.cog_data_path / "bgs/competitive.png",
             self.bundled_data_path / "bgs/competitive.png",
-            self.competitive_template,
+            "competitive",
         )
 
     @rlset_bgimage_competitive.command("overlay")
@@ -150,11 +379,14 @@ class SettingsMixin(MixinMeta):
             percentage,
             "competitive",
             self.config.competitive_overlay,
-            self.competitive_template,
+            "competitive",
         )
 
     async def _rlset_bgimage_set(
-        self, ctx: commands.Context, filename: Path, template: RLStatsImageTemplate
+        self,
+        ctx: commands.Context,
+        filename: Path,
+        template_name: Literal["competitive", "extramodes"],
     ) -> None:
         if not ctx.message.attachments:
             await ctx.send("You have to send background image.")
@@ -179,7 +411,7 @@ class SettingsMixin(MixinMeta):
                 ImageFile.ImageFile, await self._run_in_executor(im.convert, "RGBA")
             )
             await self._run_in_executor(im.save, filename, "PNG")
-            template.bg_image = filename
+            await self._set_template_background(template_name, bg_image=filename)
         await ctx.send("Background image was successfully set.")
 
     async def _rlset_bgimage_reset(
@@ -188,7 +420,7 @@ class SettingsMixin(MixinMeta):
         mode: str,
         custom_filename: Path,
         default_filename: Path,
-        template: RLStatsImageTemplate,
+        template_name: Literal["competitive", "extramodes"],
     ) -> None:
         try:
             custom_filename.unlink()
@@ -197,10 +429,13 @@ class SettingsMixin(MixinMeta):
                 f"There was no custom background set for {mode} stats image."
             )
         else:
+            async with ctx.typing():
+                await self._set_template_background(
+                    template_name, bg_image=default_filename
+                )
             await ctx.send(
                 f"Background for {mode} stats image is changed back to default."
             )
-            template.bg_image = default_filename
 
     async def _rlset_bgimage_overlay(
         self,
@@ -208,16 +443,18 @@ class SettingsMixin(MixinMeta):
         percentage: Optional[int],
         mode: str,
         value_obj: Value,
-        template: RLStatsImageTemplate,
+        template_name: Literal["competitive", "extramodes"],
     ) -> None:
         if percentage is None:
             await value_obj.clear()
-            template.bg_overlay = await value_obj()
+            await self._set_template_background(
+                template_name, bg_overlay=await value_obj()
+            )
             await ctx.send(f"Overlay percentage for {mode} stats image reset.")
             return
         if not 0 <= percentage <= 100:
             await ctx.send("Percentage value has to be in range 0-100.")
             return
         await value_obj.set(percentage)
-        template.bg_overlay = percentage
+        await self._set_template_background(template_name, bg_overlay=percentage)
         await ctx.send(f"Overlay percentage for {mode} stats set to {percentage}%")
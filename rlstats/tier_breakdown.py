@@ -0,0 +1,208 @@
+# Copyright 2018-2020 Jakub Kuczys (https://github.com/jack1142)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+__all__ = ("TierEstimates", "TierBreakdownStore")
+
+# [playlist_id, tier, division, begin, end]
+RowType = Sequence[int]
+
+
+class TierEstimates(NamedTuple):
+    """
+    Tier estimates of a playlist.
+
+    ``div_*`` and ``tier_*`` values are the amounts of points needed
+    to go a division/tier down or up, `None` when they can't be estimated.
+    """
+
+    tier: int
+    division: int
+    div_down: Optional[int] = None
+    div_up: Optional[int] = None
+    tier_down: Optional[int] = None
+    tier_up: Optional[int] = None
+
+
+class _PlaylistIndex:
+    """Divisions of a single playlist sorted by the skill they begin at."""
+
+    __slots__ = ("begins", "ends", "tiers", "divisions", "positions")
+
+    def __init__(self, rows: Iterable[RowType]) -> None:
+        self.begins = array("i")
+        self.ends = array("i")
+        self.tiers = array("b")
+        self.divisions = array("b")
+        # (tier, division) -> position in the arrays
+        self.positions: Dict[Tuple[int, int], int] = {}
+        for _, tier, division, begin, end in sorted(rows, key=lambda row: row[3]):
+            self.positions[(tier, division)] = len(self.begins)
+            self.begins.append(begin)
+            self.ends.append(end)
+            self.tiers.append(tier)
+            self.divisions.append(division)
+
+    def find_division(self, skill: int, tier_max: int) -> Optional[Tuple[int, int]]:
+        """
+        Finds the division for given skill with the same rules as `rlapi`.
+
+        When skill isn't within bounds of any division, the division
+        next to the nearest bound is used, i.e. the division below the nearest
+        beginning or the division above the nearest end (preferring the beginning
+        on ties). This assumes that the divisions don't overlap.
+        """
+        if not self.begins:
+            return None
+        # last division beginning at or below the skill
+        idx = bisect_right(self.begins, skill) - 1
+        if idx >= 0:
+            # divisions can share a bound, the lower one is used then
+            if idx > 0 and self.ends[idx - 1] >= skill:
+                idx -= 1
+            if self.ends[idx] >= skill:
+                return (self.tiers[idx], self.divisions[idx])
+        if idx + 1 < len(self.begins) and (
+            idx < 0 or self.begins[idx + 1] - skill <= skill - self.ends[idx]
+        ):
+            tier = self.tiers[idx + 1]
+            division = self.divisions[idx + 1] - 1
+        else:
+            tier = self.tiers[idx]
+            division = self.divisions[idx] + 1
+
+        if division == -1:
+            if tier <= 1:
+                return (1, 0)
+            return (tier - 1, 3)
+        if division == 4:
+            return (min(tier + 1, tier_max), 0)
+        return (tier, division)
+
+    def get_bounds(self, tier: int, division: int) -> Optional[Tuple[int, int]]:
+        """Get ``(begin, end)`` skill bounds of given division."""
+        if (idx := self.positions.get((tier, division))) is None:
+            return None
+        return (self.begins[idx], self.ends[idx])
+
+
+class TierBreakdownStore:
+    """
+    Tier breakdown kept as a flat list of rows, with per-playlist sorted indexes.
+
+    Rows are in ``[playlist_id, tier, division, begin, end]`` format
+    which is stored in Config as is, without the need to convert dict keys
+    from strings back to integers.
+    """
+
+    def __init__(self, rows: Iterable[RowType] = ()) -> None:
+        self.rows: List[List[int]] = []
+        self._indexes: Dict[int, _PlaylistIndex] = {}
+        self.set_rows(rows)
+
+    def __bool__(self) -> bool:
+        return bool(self.rows)
+
+    def set_breakdown(self, breakdown: Dict[Any, Any]) -> None:
+        """
+        Sets tier breakdown from nested tier breakdown dict.
+
+        Keys of the dict can be either integers or strings with integers
+        (as stored in Config by older versions of the cog).
+        """
+        self.set_rows(
+            [int(playlist_id), int(tier), int(division), begin, end]
+            for playlist_id, tiers in breakdown.items()
+            for tier, divisions in tiers.items()
+            for division, (begin, end) in divisions.items()
+        )
+
+    def to_breakdown(self) -> Dict[int, Dict[int, Dict[int, Tuple[int, int]]]]:
+        """Builds nested tier breakdown dict, in the format used by `rlapi`."""
+        breakdown: Dict[int, Dict[int, Dict[int, Tuple[int, int]]]] = {}
+        for playlist_id, tier, division, begin, end in self.rows:
+            tiers = breakdown.setdefault(playlist_id, {})
+            tiers.setdefault(tier, {})[division] = (begin, end)
+        return breakdown
+
+    def set_rows(self, rows: Iterable[RowType]) -> None:
+        new_rows = [list(row) for row in rows]
+        rows_by_playlist: Dict[int, List[List[int]]] = {}
+        for row in new_rows:
+            rows_by_playlist.setdefault(row[0], []).append(row)
+
+        self.rows = new_rows
+        self._indexes = {
+            playlist_id: _PlaylistIndex(playlist_rows)
+            for playlist_id, playlist_rows in rows_by_playlist.items()
+        }
+
+    def find_division(
+        self, playlist_id: int, skill: int, *, tier_max: int
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Finds the division (as ``(tier, division)`` tuple) for given skill rating.
+
+        Returns `None` when there's no breakdown for given playlist.
+        """
+        try:
+            index = self._indexes[playlist_id]
+        except KeyError:
+            return None
+        return index.find_division(skill, tier_max)
+
+    def get_tier_estimates(
+        self, playlist_id: int, *, skill: int, tier: int, division: int, tier_max: int
+    ) -> TierEstimates:
+        """
+        Estimates tier of unranked playlist and points needed to change the rank.
+
+        This gives the same results as `rlapi.TierEstimates`
+        as long as the divisions in the breakdown don't overlap.
+        """
+        index = self._indexes.get(playlist_id)
+        if index is None:
+            return TierEstimates(tier, division)
+        if tier == 0:
+            found = index.find_division(skill, tier_max)
+            # this assert is safe, indexes are only created for non-empty playlists
+            assert found is not None, "mypy"
+            tier, division = found
+        if tier == 0:
+            return TierEstimates(tier, division)
+
+        def points_to(
+            bounds: Optional[Tuple[int, int]], bound_idx: int, up: bool
+        ) -> Optional[int]:
+            if bounds is None:
+                return None
+            points = math.ceil(bounds[bound_idx] - skill)
+            # player can be outside of the bounds of their (not estimated) division
+            if up:
+                return 1 if points < 0 else points
+            return -1 if points > 0 else points
+
+        div_down = tier_down = div_up = tier_up = None
+        if not (tier == 1 and division == 0):
+            div_down = points_to(index.get_bounds(tier, division), 0, False)
+        if tier != 1:
+            tier_down = points_to(index.get_bounds(tier, 0), 0, False)
+        if tier != tier_max:
+            div_up = points_to(index.get_bounds(tier, division), 1, True)
+            tier_up = points_to(index.get_bounds(tier, 3), 1, True)
+        return TierEstimates(tier, division, div_down, div_up, tier_down, tier_up)